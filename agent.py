@@ -1,10 +1,31 @@
 # app/agent.py
 
+import asyncio
 import logging
-from typing import TypedDict, Annotated, List
+import os
+import time
+from typing import TypedDict, Annotated, List, Union
 from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, SystemMessage
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
+from langchain_core.runnables import RunnableLambda
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END, START
+from fast_answer import render_fast_answer
+from join_paths import describe_join_paths
+from schema_cache import DEFAULT_CACHE_DIR, DEFAULT_SCHEMA_WORKERS, LazyTableDescriptions, database_fingerprint, load_schema_description
+from llm_config import llm_identity
+from model_router import ModelRouter
+from query_cache import QuestionCache
+from query_budget import CancelHandle, QueryBudgetExceeded, QueryCancelled
+from query_result import QueryResult
+from result_cache import ResultCache
+from result_stream import ResultLimits, astream_query, stream_query
+from semantic_cache import SemanticQuestionCache
+from speculative import speculative_generate_and_execute
+from sql_validation import validate_sql
+from schema_refresh import SchemaCatalog, SchemaRefresher, SchemaSnapshot
+from schema_retrieval import estimate_tokens
+from utils import AsyncSQLDatabase
+from value_index import ValueIndex, describe_value_matches, ensure_value_index
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -15,33 +36,205 @@ class AgentState(TypedDict, total=False):
     user_question: str
     schema: str
     sql_query: str
-    query_result: str
+    query_result: Union[QueryResult, str]  # str only for error messages
     final_answer: str
+    schema_tables: List[str]
+    join_paths: str
+    value_tables: List[str]
+    value_matches: str
+    value_literals: List[str]
+    schema_fingerprint: str
+    sql_source: str
+    question_cache_key: str
+    cache_namespace: str
+    validation_error: str
+    rejected_sql: str
+    validation_failures: int
+    model_route: str
+    result_truncated: bool
+    result_note: str
+    budget_exceeded: bool
+    budget_retries: int
+    query_cancelled: bool
+    metrics: Annotated[dict, lambda x, y: {**x, **y}]
 
 
 # --- Node Functions ---
-def get_schema_node(state: AgentState):
-    """Fetch database schema and store in state."""
+def link_values_node(state: AgentState, value_index: ValueIndex):
+    """Resolves literals mentioned in the question to canonical column values."""
+    logger.info("Node: link_values")
+    start = time.perf_counter()
+    matches = value_index.lookup(state["user_question"])
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"Value linking: {len(matches)} match(es) in {elapsed_ms:.2f} ms")
+    return {
+        "value_tables": list(dict.fromkeys(m.table for m in matches)),
+        "value_matches": describe_value_matches(matches),
+        "value_literals": list(dict.fromkeys(m.value for m in matches)),
+        "metrics": {"value_lookup_ms": elapsed_ms, "value_matches": len(matches)},
+    }
+
+
+def get_schema_node(state: AgentState, snapshot: SchemaSnapshot, top_k_tables=5, schema_token_budget=None):
+    """Selects the tables relevant to the question and stores their schema in state."""
     logger.info("Node: get_schema")
-    return {"schema": state["schema"], "messages": [SystemMessage(content=state["schema"])]}
+    schema_index = snapshot.index
+    start = time.perf_counter()
+    table_names = schema_index.select(state["user_question"], top_k=top_k_tables, token_budget=schema_token_budget,
+                                      required=state.get("value_tables"))
+    schema = schema_index.render(table_names)
+    join_paths = describe_join_paths(schema_index.join_edges(table_names))
+    elapsed_ms = (time.perf_counter() - start) * 1000
 
+    full_tokens = schema_index.full_tokens
+    pruned_tokens = estimate_tokens(schema)
+    reduction = f" ({100 * (1 - pruned_tokens / full_tokens):.0f}% smaller)" if full_tokens else ""
+    logger.info(
+        f"Schema pruning: {len(schema_index.table_names)} -> {len(table_names)} tables, "
+        f"~{full_tokens or '?'} -> ~{pruned_tokens} tokens{reduction} in {elapsed_ms:.2f} ms: {table_names}"
+    )
+    return {
+        "schema": schema,
+        "schema_tables": table_names,
+        "schema_fingerprint": snapshot.fingerprint,
+        "join_paths": join_paths,
+        "messages": [SystemMessage(content=schema)],
+        "metrics": {
+            "schema_tables_total": len(schema_index.table_names),
+            "schema_tables_selected": len(table_names),
+            "schema_tokens_full": full_tokens,
+            "schema_tokens_pruned": pruned_tokens,
+            "schema_pruning_ms": elapsed_ms,
+        },
+    }
 
-def call_model_to_generate_query(state: AgentState, llm):
-    """Generates the SQL query using LLM."""
-    logger.info("Node: call_model_to_generate_query")
-    prompt = f"""
-You are a SQL expert. Based on the user's question and the database schema,
+
+def route_model_node(state: AgentState, model_router: ModelRouter, snapshot: SchemaSnapshot, top_k_tables=5):
+    """
+    Picks the small or large model for generation from the question's
+    complexity, counting only the tables the question matches directly (not
+    the FK neighbours get_schema adds for context) and the joins between them.
+    """
+    logger.info("Node: route_model")
+    schema_index = snapshot.index
+    tables = schema_index.matched(state["user_question"], top_k=top_k_tables, required=state.get("value_tables"))
+    join_paths = describe_join_paths(schema_index.join_edges(tables)) if len(tables) > 1 else ""
+    route, score, _ = model_router.route(state["user_question"], tables, join_paths)
+    return {"model_route": route, "metrics": {"model_route": route, "complexity_score": score}}
+
+
+def plan_generation(state: AgentState, llm, model_router: ModelRouter = None):
+    """
+    Returns (llm, state, routing) for the next generation attempt. A small-model
+    query that failed validation or execution is escalated to the large model;
+    an execution error is passed on to the prompt like a validation error.
+    """
+    if model_router is None:
+        return llm, state, {}
+    route = state.get("model_route", "large")
+    failed_execution = is_error_result(state.get("query_result", ""))
+    if route == "small" and (state.get("validation_error") or failed_execution):
+        model_router.stats.record_escalation()
+        logger.info("Escalating generation to the large model")
+        if failed_execution and not state.get("budget_exceeded"):
+            state = {**state, "validation_error": state["query_result"], "rejected_sql": state["sql_query"]}
+        route = "large"
+    routing = {"model_route": route, "metrics": {"model_route": route}}
+    if route != state.get("model_route"):
+        routing["metrics"]["model_escalated"] = True
+    return model_router.llm_for(route), state, routing
+
+
+def finish_routed_generation(update: dict, routing: dict, start: float, model_router: ModelRouter = None):
+    """Merges the routing decision into a generation result and records per-route latency."""
+    if not routing:
+        return update
+    if update.get("sql_source") in ("llm", "speculative"):
+        model_router.stats.record_latency(routing["model_route"], (time.perf_counter() - start) * 1000)
+    return {**update, **routing, "metrics": {**update.get("metrics", {}), **routing["metrics"]}}
+
+
+def lookup_cached_sql(state: AgentState, llm, question_cache: QuestionCache = None,
+                      semantic_cache: SemanticQuestionCache = None):
+    """
+    Returns (cached_update, pending): cached_update is the node result on a
+    cache hit (else None); pending carries the cache keys and metrics to merge
+    into the result of a fresh generation.
+    """
+    cache_key = None
+    namespace = f"{state.get('schema_fingerprint', '')}|{llm_identity(llm)}"
+    metrics = {}
+    if state.get("validation_error"):
+        # Retrying a rejected query: the cached SQL may be the one that failed.
+        question_cache = semantic_cache = None
+        if state.get("question_cache_key"):
+            cache_key = state["question_cache_key"]
+    if question_cache is not None:
+        cache_key = QuestionCache.key(state["user_question"], state.get("schema_fingerprint", ""), llm_identity(llm))
+        sql = question_cache.get(cache_key)
+        if sql is not None:
+            logger.info(f"Question cache hit: {sql} ({question_cache.stats()})")
+            return {"sql_query": sql, "sql_source": "cache", "metrics": {"question_cache": "hit"}}, None
+        metrics["question_cache"] = "miss"
+    if semantic_cache is not None:
+        match = semantic_cache.lookup(state["user_question"], namespace, state.get("value_literals", ()))
+        if match is not None:
+            logger.info(f"Semantic cache hit ({match.similarity:.2f} vs {match.question!r}): {match.sql}")
+            return {
+                "sql_query": match.sql,
+                "sql_source": "semantic_cache",
+                "metrics": {"semantic_cache": "hit", "semantic_similarity": match.similarity},
+            }, None
+        metrics["semantic_cache"] = "miss"
+    return None, {"question_cache_key": cache_key, "cache_namespace": namespace, "metrics": metrics}
+
+
+GENERATION_INSTRUCTIONS = """You are a SQL expert. Based on the database schema below and the user's question,
 generate ONLY a syntactically correct SQL query.
+Output ONLY the SQL query, no explanation, no commentary."""
+
 
-User Question:
-{state['user_question']}
+def build_generation_prompt(state: AgentState) -> List[BaseMessage]:
+    """
+    Builds the generation prompt as a stable prefix (instructions, schema and
+    join paths, identical for every question touching the same tables) and a
+    variable suffix (value hints and the question), so local models can reuse
+    the KV cache of the prefix instead of re-prefilling the schema.
+    """
+    prefix = f"""{GENERATION_INSTRUCTIONS}
 
 Schema:
 {state['schema']}
+"""
+    if state.get("join_paths"):
+        prefix += f"""
+Join Paths (use these foreign-key conditions to join tables):
+{state['join_paths']}
+"""
+    suffix = ""
+    if state.get("value_matches"):
+        suffix = f"""Known Values (use these exact literals in filters):
+{state['value_matches']}
 
-Output ONLY the SQL query, no explanation, no commentary.
 """
-    response = llm.invoke(prompt)
+    if state.get("validation_error"):
+        suffix += f"""Previous Attempt (rejected, write a corrected query):
+{state['rejected_sql']}
+Problem: {state['validation_error']}
+
+"""
+    suffix += f"""User Question:
+{state['user_question']}"""
+    return [SystemMessage(content=prefix), HumanMessage(content=suffix)]
+
+
+def prompt_tokens(messages: List[BaseMessage]) -> int:
+    return sum(estimate_tokens(m.content) for m in messages)
+
+
+def finish_generation(response, prompt: List[BaseMessage], start: float, pending: dict):
+    """Normalizes the LLM response into the generate_query node result."""
+    elapsed_ms = (time.perf_counter() - start) * 1000
 
     # Normalize response to string
     if isinstance(response, str):
@@ -49,82 +242,556 @@ Output ONLY the SQL query, no explanation, no commentary.
     else:
         sql = response.content.strip().strip("`")
 
-    logger.info(f"Generated SQL: {sql}")
-    return {"sql_query": sql}
+    tokens = prompt_tokens(prompt)
+    logger.info(f"Generated SQL: {sql} (prompt ~{tokens} tokens, {elapsed_ms:.0f} ms)")
+    metrics = {"generate_prompt_tokens": tokens, "generate_llm_ms": elapsed_ms}
+    return {**pending, "sql_query": sql, "sql_source": "llm", "metrics": {**pending["metrics"], **metrics}}
+
+
+def call_model_to_generate_query(state: AgentState, llm, question_cache: QuestionCache = None,
+                                 semantic_cache: SemanticQuestionCache = None):
+    """Generates the SQL query using LLM, reusing cached SQL for repeated or paraphrased questions."""
+    logger.info("Node: call_model_to_generate_query")
+    cached, pending = lookup_cached_sql(state, llm, question_cache, semantic_cache)
+    if cached is not None:
+        return cached
+    prompt = build_generation_prompt(state)
+    start = time.perf_counter()
+    response = llm.invoke(prompt)
+    return finish_generation(response, prompt, start, pending)
+
+
+async def acall_model_to_generate_query(state: AgentState, llm, question_cache: QuestionCache = None,
+                                        semantic_cache: SemanticQuestionCache = None):
+    """Async variant of call_model_to_generate_query (llm.ainvoke)."""
+    logger.info("Node: acall_model_to_generate_query")
+    cached, pending = lookup_cached_sql(state, llm, question_cache, semantic_cache)
+    if cached is not None:
+        return cached
+    prompt = build_generation_prompt(state)
+    start = time.perf_counter()
+    response = await llm.ainvoke(prompt)
+    return finish_generation(response, prompt, start, pending)
+
+
+def speculative_generate_query(state: AgentState, llm, db, candidates: int = 3,
+                               question_cache: QuestionCache = None,
+                               semantic_cache: SemanticQuestionCache = None,
+                               limits: ResultLimits = ResultLimits(), cancel: CancelHandle = None):
+    """
+    Generates several candidate queries in parallel and executes them on
+    read-only connections; the first successful non-empty result wins, so this
+    node fills in both sql_query and query_result. cancel stops every
+    candidate query still running.
+    """
+    logger.info("Node: speculative_generate_query")
+    cached, pending = lookup_cached_sql(state, llm, question_cache, semantic_cache)
+    if cached is not None:
+        return cached
+    outcome = speculative_generate_and_execute(build_generation_prompt(state), llm, db, candidates, limits=limits,
+                                               cancel=cancel)
+    if outcome["cancelled"]:
+        failure = execution_failure(state, outcome["sql"], QueryCancelled("Query cancelled"))
+        return {**pending, **failure, "sql_query": outcome["sql"], "sql_source": "speculative",
+                "metrics": {**pending["metrics"], **outcome["metrics"], **failure["metrics"]}}
+    update = {
+        **pending,
+        "sql_query": outcome["sql"],
+        "sql_source": "speculative",
+        "query_result": outcome["result"],
+        "result_truncated": outcome["truncated"],
+        "result_note": outcome["note"],
+        "budget_exceeded": False,
+        "metrics": {**pending["metrics"], **outcome["metrics"]},
+    }
+    if outcome["succeeded"]:
+        remember_query({**state, **update}, question_cache, semantic_cache)
+    return update
+
+
+def validate_sql_node(state: AgentState, db, snapshot: SchemaSnapshot):
+    """Checks the generated SQL locally and with EXPLAIN before it is executed."""
+    logger.info("Node: validate_sql")
+    start = time.perf_counter()
+    error = validate_sql(state["sql_query"], db, snapshot.index)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if error is None:
+        logger.info(f"SQL validated in {elapsed_ms:.1f} ms")
+        return {"validation_error": "", "metrics": {"validation_ms": elapsed_ms}}
+    failures = state.get("validation_failures", 0) + 1
+    logger.warning(f"SQL rejected before execution ({failures}): {error}")
+    return {
+        "validation_error": error,
+        "rejected_sql": state["sql_query"],
+        "validation_failures": failures,
+        "metrics": {"validation_ms": elapsed_ms, "validation_failures": failures},
+    }
+
+
+def route_after_validate(state: AgentState, max_retries: int = 2) -> str:
+    """Sends rejected SQL back to generation, up to max_retries times, then lets the database decide."""
+    if not state.get("validation_error"):
+        return "execute_query"
+    if state.get("validation_failures", 0) <= max_retries:
+        return "generate_query"
+    logger.warning("Validation retries exhausted; executing the last query as is")
+    return "execute_query"
+
+
+def is_error_result(result: Union[QueryResult, str]) -> bool:
+    """True for the error strings produced by the query tool or execute_sql_query."""
+    return isinstance(result, str) and result.startswith(("Error:", "SQL execution failed:"))
+
+
+def remember_query(state: AgentState, question_cache: QuestionCache = None,
+                   semantic_cache: SemanticQuestionCache = None):
+    """Stores freshly generated SQL that executed successfully in the question caches."""
+    if state.get("sql_source") not in ("llm", "speculative"):
+        return
+    if question_cache is not None and state.get("question_cache_key"):
+        question_cache.put(state["question_cache_key"], state["sql_query"], state["user_question"])
+    if semantic_cache is not None and state.get("cache_namespace"):
+        semantic_cache.add(state["user_question"], state["cache_namespace"], state["sql_query"],
+                           state.get("value_literals", ()))
+
+
+def finish_execution(state: AgentState, result: QueryResult, start: float, question_cache: QuestionCache = None,
+                     semantic_cache: SemanticQuestionCache = None, result_cache_status: str = None):
+    """Builds the execute_query node result from a streamed (or cached) result."""
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    source = " from result cache" if result_cache_status == "hit" else ""
+    logger.info(f"SQL Result ({len(result)} rows{source}, {elapsed_ms:.0f} ms): {result.preview()}")
+    remember_query(state, question_cache, semantic_cache)
+    metrics = {"result_cache": result_cache_status} if result_cache_status else {}
+    return {
+        "query_result": result,
+        "result_truncated": result.truncated,
+        "result_note": result.note(),
+        "metrics": {
+            "result_rows": len(result),
+            "result_bytes": result.nbytes,
+            "result_total_rows": result.total_rows,
+            "result_total_exact": result.total_exact,
+            "execute_ms": elapsed_ms,
+            **metrics,
+        },
+    }
+
+
+def cancel_handle(config) -> CancelHandle:
+    """The CancelHandle a caller put in the run config, if any."""
+    return (config or {}).get("configurable", {}).get("cancel_handle")
 
 
-def execute_sql_query(state: AgentState, run_query_tool):
-    """Executes the generated SQL query using the DB tool."""
+CHEAPER_QUERY_HINT = ("Write a cheaper query: join on key columns instead of cross joins, filter before "
+                      "joining, aggregate in SQL and add a LIMIT.")
+
+
+def execution_failure(state: AgentState, query: str, error: Exception):
+    """Builds the execute_query node result for a failed, over-budget or cancelled query."""
+    if isinstance(error, QueryCancelled):
+        logger.info(f"Query cancelled: {query}")
+        answer = "The query was cancelled."
+        return {
+            "query_result": f"Error: {error}",
+            "query_cancelled": True,
+            "messages": [AIMessage(content=answer)],
+            "final_answer": answer,
+            "metrics": {"query_cancelled": True},
+        }
+    if isinstance(error, QueryBudgetExceeded):
+        retries = state.get("budget_retries", 0) + 1
+        logger.warning(f"{error} ({retries}): {query}")
+        return {
+            "query_result": f"Error: {error}",
+            "result_truncated": False,
+            "result_note": "",
+            "budget_exceeded": True,
+            "budget_retries": retries,
+            "validation_error": f"{error}. {CHEAPER_QUERY_HINT}",
+            "rejected_sql": query,
+            "metrics": {"budget_retries": retries},
+        }
+    err = f"Error: {error}"
+    logger.error(err)
+    return {"query_result": err, "result_truncated": False, "result_note": "", "budget_exceeded": False}
+
+
+def execute_sql_query(state: AgentState, db, limits: ResultLimits = ResultLimits(),
+                      question_cache: QuestionCache = None, semantic_cache: SemanticQuestionCache = None,
+                      result_cache: ResultCache = None, cancel: CancelHandle = None):
+    """
+    Executes the generated SQL on a streaming cursor, keeping at most the
+    row/byte budget of limits and stopping it after limits.timeout seconds or
+    when cancel is triggered; caches SQL that ran successfully. With a
+    result_cache, an identical query on unchanged data isn't re-executed.
+    """
     logger.info("Node: execute_sql_query")
     query = state["sql_query"]
+    start = time.perf_counter()
+    cache_key = result_cache.key(db, query, limits) if result_cache is not None else None
+    cached = result_cache.get(cache_key) if result_cache is not None else None
+    if cached is not None:
+        return finish_execution(state, cached, start, question_cache, semantic_cache, "hit")
     try:
-        result = run_query_tool.invoke({"query": query})
-        logger.info(f"SQL Result: {result}")
-        return {"query_result": str(result)}
+        result = stream_query(db, query, limits, cancel)
     except Exception as e:
-        err = f"SQL execution failed: {e}"
-        logger.error(err)
-        return {"query_result": err}
+        return execution_failure(state, query, e)
+    if result_cache is not None:
+        result_cache.put(cache_key, result)
+    return finish_execution(state, result, start, question_cache, semantic_cache,
+                            "miss" if cache_key is not None else None)
 
 
-def summarize_result(state: AgentState, llm):
-    """Summarizes the SQL query result into a final answer."""
-    logger.info("Node: summarize_result")
-    query_result_str = str(state.get('query_result', ''))
+async def aexecute_sql_query(state: AgentState, db, async_db: AsyncSQLDatabase = None,
+                             limits: ResultLimits = ResultLimits(), question_cache: QuestionCache = None,
+                             semantic_cache: SemanticQuestionCache = None, result_cache: ResultCache = None,
+                             cancel: CancelHandle = None):
+    """
+    Async variant of execute_sql_query. Uses the async driver when async_db is
+    given, otherwise streams the query in a worker thread.
+    """
+    logger.info("Node: aexecute_sql_query")
+    query = state["sql_query"]
+    start = time.perf_counter()
+    cache_key = None
+    if result_cache is not None:
+        # Reading the data version may be a database round trip.
+        cache_key = await asyncio.to_thread(result_cache.key, db, query, limits)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return finish_execution(state, cached, start, question_cache, semantic_cache, "hit")
+    try:
+        if async_db is not None:
+            result = await astream_query(async_db.engine, query, limits, async_db.schema, async_db.max_string_length,
+                                         cancel)
+        else:
+            result = await asyncio.to_thread(stream_query, db, query, limits, cancel)
+    except Exception as e:
+        return execution_failure(state, query, e)
+    if result_cache is not None:
+        result_cache.put(cache_key, result)
+    return finish_execution(state, result, start, question_cache, semantic_cache,
+                            "miss" if cache_key is not None else None)
+
 
-    prompt = f"""
-You are a helpful assistant. Based on the user's question and the result of a database query, provide a clear, natural language answer.
+SUMMARY_INSTRUCTIONS = ("You are a helpful assistant. Based on the user's question and the result of a "
+                        "database query, provide a clear, natural language answer.")
 
-User Question:
+
+def build_summary_prompt(state: AgentState) -> List[BaseMessage]:
+    result = state.get('query_result', '')
+    query_result_str = str(result)
+    if isinstance(result, QueryResult) and result.columns:
+        query_result_str = f"Columns: {', '.join(result.columns)}\n{query_result_str}"
+
+    return [
+        SystemMessage(content=SUMMARY_INSTRUCTIONS),
+        HumanMessage(content=f"""User Question:
 {state.get('user_question', '')}
 
 Database Query Result:
 {query_result_str}
+{state.get('result_note', '')}
 
-Final Answer:
-"""
-    response = llm.invoke(prompt)
+Final Answer:"""),
+    ]
 
-    # Normalize response to string
-    if isinstance(response, str):
-        answer = response.strip()
-    else:
-        answer = response.content.strip()
 
-    logger.info(f"Final Answer: {answer}")
+class _AnswerStream:
+    """Collects streamed answer tokens, forwarding each to the graph's custom stream."""
+
+    def __init__(self):
+        self.writer = get_stream_writer()
+        self.start = time.perf_counter()
+        self.first_token_ms = None
+        self.parts = []
+
+    def add(self, chunk):
+        # Normalize chunk to string
+        token = chunk if isinstance(chunk, str) else chunk.content
+        if not token:
+            return
+        if self.first_token_ms is None:
+            self.first_token_ms = (time.perf_counter() - self.start) * 1000
+        self.parts.append(token)
+        self.writer({"answer_token": token})
+
+    def result(self):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        first_token_ms = self.first_token_ms or elapsed_ms
+        answer = "".join(self.parts).strip()
+
+        logger.info(f"Final Answer: {answer} (first token {first_token_ms:.0f} ms, total {elapsed_ms:.0f} ms)")
+
+        return {
+            "messages": [AIMessage(content=answer)],
+            "final_answer": answer,
+            "metrics": {
+                "answer_path": "llm",
+                "summarize_first_token_ms": first_token_ms,
+                "summarize_llm_ms": elapsed_ms,
+            },
+        }
+
+
+def summarize_result(state: AgentState, llm):
+    """
+    Summarizes the SQL query result into a final answer, streaming tokens as
+    {"answer_token": ...} events to graph.stream(..., stream_mode="custom").
+    """
+    logger.info("Node: summarize_result")
+    stream = _AnswerStream()
+    for chunk in llm.stream(build_summary_prompt(state)):
+        stream.add(chunk)
+    return stream.result()
 
+
+async def asummarize_result(state: AgentState, llm):
+    """Async variant of summarize_result (llm.astream)."""
+    logger.info("Node: asummarize_result")
+    stream = _AnswerStream()
+    async for chunk in llm.astream(build_summary_prompt(state)):
+        stream.add(chunk)
+    return stream.result()
+
+
+def fast_answer_node(state: AgentState):
+    """Answers scalar/single-row/small results from a template, skipping the LLM summarizer."""
+    logger.info("Node: fast_answer")
+    start = time.perf_counter()
+    answer = render_fast_answer(state.get("query_result", ""))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    get_stream_writer()({"answer_token": answer})
+    logger.info(f"Final Answer (fast path, {elapsed_ms * 1000:.0f} us): {answer}")
     return {
         "messages": [AIMessage(content=answer)],
-        "final_answer": answer
+        "final_answer": answer,
+        "metrics": {"answer_path": "fast", "fast_answer_ms": elapsed_ms},
     }
 
 
+def route_after_generate(state: AgentState, fast_answers: bool = True, validate: bool = False,
+                         escalate: bool = False, max_budget_retries: int = 0) -> str:
+    """Skips execute_query when speculative generation already produced a result."""
+    if "query_result" not in state:
+        return "validate_query" if validate else "execute_query"
+    return route_after_execute(state, fast_answers, escalate, max_budget_retries)
+
+
+def route_after_execute(state: AgentState, fast_answers: bool = True, escalate: bool = False,
+                        max_budget_retries: int = 0) -> str:
+    """
+    Sends trivially renderable results to fast_answer, everything else to the
+    LLM. With escalate, a failed small-model query goes back to generation;
+    so does a query over its time budget, up to max_budget_retries times.
+    A cancelled query ends the run.
+    """
+    if state.get("query_cancelled"):
+        return END
+    result = state.get("query_result", "")
+    if is_error_result(result):
+        if state.get("budget_exceeded") and state.get("budget_retries", 0) <= max_budget_retries:
+            return "generate_query"
+        if escalate and state.get("model_route") == "small":
+            return "generate_query"
+        return "summarize_result"
+    if not fast_answers or state.get("result_truncated") or render_fast_answer(result) is None:
+        return "summarize_result"
+    return "fast_answer"
+
+
+def load_schema_catalog(db, schema_cache_dir=DEFAULT_CACHE_DIR, lazy_schema=False, lazy_schema_cache_size=256,
+                        schema_workers=DEFAULT_SCHEMA_WORKERS) -> SchemaCatalog:
+    """Loads the schema snapshot the graph reads; can be shared by graphs on the same database."""
+    # fetch schema once at init (or reuse the on-disk cache if the schema is unchanged)
+    if lazy_schema:
+        fingerprint = database_fingerprint(db)
+        table_descriptions = LazyTableDescriptions(db, db.get_usable_table_names(), lazy_schema_cache_size)
+    else:
+        fingerprint, table_descriptions = load_schema_description(db, schema_cache_dir, schema_workers)
+    return SchemaCatalog(fingerprint, table_descriptions)
+
+
+def threaded_node(func) -> RunnableLambda:
+    """Node for a blocking function: called directly by invoke/stream, in a worker thread by ainvoke/astream."""
+    async def afunc(state):
+        return await asyncio.to_thread(func, state)
+
+    return RunnableLambda(func, afunc=afunc)
+
+
 # --- Graph Builder ---
-def create_sql_agent_graph(llm_instance, db):
-    """Builds the SQL agent LangGraph with schema, query generation, execution, summarization."""
-    toolkit = SQLDatabaseToolkit(db=db, llm=llm_instance)
-    tools = toolkit.get_tools()
+def create_sql_agent_graph(llm_instance, db, schema_cache_dir=DEFAULT_CACHE_DIR,
+                           top_k_tables=5, schema_token_budget=4000, schema_refresh_interval=None,
+                           value_index_dir=None, lazy_schema=False, lazy_schema_cache_size=256,
+                           schema_workers=DEFAULT_SCHEMA_WORKERS, question_cache=None,
+                           semantic_cache=None, async_db=True, fast_answers=True, speculative_candidates=1,
+                           validate_queries=True, max_validation_retries=2, model_router: ModelRouter = None,
+                           max_result_rows=1000, max_result_bytes=1_000_000, result_cache: ResultCache = None,
+                           query_timeout=30.0, max_budget_retries=1, schema_catalog: SchemaCatalog = None):
+    """
+    Builds the SQL agent LangGraph with schema, query generation, execution, summarization.
+    The rendered schema is persisted under schema_cache_dir, keyed by a database
+    fingerprint, so warm starts skip reflection; pass None to disable the cache.
+    Each question only sees its top_k_tables most relevant tables (plus FK
+    neighbours), capped at roughly schema_token_budget tokens; None disables the cap.
+    With schema_refresh_interval (seconds), a background thread picks up DDL
+    changes and swaps in a re-described schema without rebuilding the graph;
+    it is exposed as graph.schema_refresher so callers can stop() it. Graphs
+    on the same database can instead share one schema_catalog (see
+    load_schema_catalog) kept current by a single SchemaRefresher.
+    With value_index_dir, question literals are linked to canonical column
+    values first; the index file is built there on first use for each schema
+    (with a lazy schema only a prebuilt index is used).
+    With lazy_schema, only the table list is loaded at startup and per-table
+    DDL/sample rows are fetched on first use, keeping at most
+    lazy_schema_cache_size tables in memory.
+    Cold-cache reflection fans out over schema_workers threads.
+    A QuestionCache passed as question_cache (shareable across sessions) skips
+    the LLM for questions already answered against the same schema and model;
+    a SemanticQuestionCache as semantic_cache does the same for paraphrases.
+    The compiled graph also supports ainvoke/astream: generation, execution and
+    summarization then use ainvoke/astream and, with async_db, an async DB
+    driver (aiosqlite/asyncpg/aiomysql) when one is installed.
+    With fast_answers, empty/scalar/single-row/small results are answered from a
+    template and only results that need prose are routed to the LLM summarizer.
+    With speculative_candidates > 1, that many queries are generated and run in
+    parallel on read-only connections and the first non-empty result wins.
+    With validate_queries, generated SQL is parsed and checked against the
+    schema catalog (sqlglot, if installed) and EXPLAINed before execution;
+    rejected queries go back to generation with the error, at most
+    max_validation_retries times.
+    With a ModelRouter as model_router, SQL generation goes to its small or
+    large model by question complexity; llm_instance still summarizes.
+    Results are fetched from a streaming cursor in batches and capped at
+    max_result_rows rows / max_result_bytes bytes; rows past the cap are only
+    counted, and the summarizer is told the result was truncated.
+    A ResultCache as result_cache (shareable across sessions) returns results
+    of identical SQL without re-executing it until the data changes.
+    Queries are stopped after query_timeout seconds (SQLite progress handler,
+    PostgreSQL statement_timeout) and regenerated as a cheaper query up to
+    max_budget_retries times. A CancelHandle passed in the run config
+    (configurable={"cancel_handle": handle}) stops the running query.
+    """
+    result_limits = ResultLimits(max_rows=max_result_rows, max_bytes=max_result_bytes, timeout=query_timeout)
 
-    run_query_tool = next(t for t in tools if t.name == "sql_db_query")
-    schema_tool = next(t for t in tools if t.name == "sql_db_schema")
+    catalog = schema_catalog
+    schema_refresher = None
+    if catalog is None:
+        catalog = load_schema_catalog(db, schema_cache_dir, lazy_schema, lazy_schema_cache_size, schema_workers)
+        if schema_refresh_interval:
+            schema_refresher = SchemaRefresher(db, catalog, schema_refresh_interval, schema_cache_dir)
+            schema_refresher.start()
+    fingerprint = catalog.snapshot().fingerprint
 
-    # fetch schema once at init
-    table_names = db.get_usable_table_names()
-    schema_description = schema_tool.invoke({"table_names": ", ".join(table_names)})
+    value_index = None
+    if value_index_dir:
+        value_index_path = os.path.join(value_index_dir, f"{fingerprint}.values.idx")
+        if not os.path.exists(value_index_path):
+            if isinstance(catalog.snapshot().tables, LazyTableDescriptions):
+                # Building scans every text column, which lazy loading exists to avoid.
+                logger.info(f"Lazy schema: value linking off until {value_index_path} is built "
+                            f"(python value_index.py <db_uri> {value_index_path})")
+            else:
+                ensure_value_index(db, value_index_path)
+        if os.path.exists(value_index_path):
+            value_index = ValueIndex(value_index_path)
+
+    async_database = AsyncSQLDatabase.from_sync(db) if async_db else None
 
     builder = StateGraph(AgentState)
 
     # Add nodes
-    builder.add_node("get_schema", lambda state: get_schema_node({**state, "schema": schema_description}))
-    builder.add_node("generate_query", lambda state: call_model_to_generate_query(state, llm_instance))
-    builder.add_node("execute_query", lambda state: execute_sql_query(state, run_query_tool))
-    builder.add_node("summarize_result", lambda state: summarize_result(state, llm_instance))
+    builder.add_node("get_schema", threaded_node(
+        lambda state: get_schema_node(state, catalog.snapshot(), top_k_tables, schema_token_budget)))
+    def execute(state, config):
+        return execute_sql_query(state, db, result_limits, question_cache, semantic_cache, result_cache,
+                                 cancel_handle(config))
+
+    async def aexecute(state, config):
+        return await aexecute_sql_query(state, db, async_database, result_limits, question_cache, semantic_cache,
+                                        result_cache, cancel_handle(config))
+
+    async def asummarize(state):
+        return await asummarize_result(state, llm_instance)
+
+    if speculative_candidates > 1:
+        def generate(state, config):
+            llm, state, routing = plan_generation(state, llm_instance, model_router)
+            start = time.perf_counter()
+            update = speculative_generate_query(state, llm, db, speculative_candidates, question_cache, semantic_cache,
+                                                result_limits, cancel_handle(config))
+            return finish_routed_generation(update, routing, start, model_router)
+
+        async def agenerate(state, config):
+            return await asyncio.to_thread(generate, state, config)
+    else:
+        def generate(state):
+            llm, state, routing = plan_generation(state, llm_instance, model_router)
+            start = time.perf_counter()
+            update = call_model_to_generate_query(state, llm, question_cache, semantic_cache)
+            return finish_routed_generation(update, routing, start, model_router)
+
+        async def agenerate(state):
+            llm, state, routing = plan_generation(state, llm_instance, model_router)
+            start = time.perf_counter()
+            update = await acall_model_to_generate_query(state, llm, question_cache, semantic_cache)
+            return finish_routed_generation(update, routing, start, model_router)
+
+    builder.add_node("generate_query", RunnableLambda(generate, afunc=agenerate))
+    builder.add_node("execute_query", RunnableLambda(execute, afunc=aexecute))
+    builder.add_node("summarize_result", RunnableLambda(
+        lambda state: summarize_result(state, llm_instance),
+        afunc=asummarize,
+    ))
+
+    if model_router is not None:
+        builder.add_node("route_model", threaded_node(
+            lambda state: route_model_node(state, model_router, catalog.snapshot(), top_k_tables)))
+    if validate_queries:
+        builder.add_node("validate_query", threaded_node(lambda state: validate_sql_node(state, db, catalog.snapshot())))
+    if value_index is not None:
+        builder.add_node("link_values", threaded_node(lambda state: link_values_node(state, value_index)))
+    if fast_answers:
+        builder.add_node("fast_answer", fast_answer_node)
 
     # Add edges
-    builder.add_edge(START, "get_schema")
-    builder.add_edge("get_schema", "generate_query")
-    builder.add_edge("generate_query", "execute_query")
-    builder.add_edge("execute_query", "summarize_result")
+    if value_index is not None:
+        builder.add_edge(START, "link_values")
+        builder.add_edge("link_values", "get_schema")
+    else:
+        builder.add_edge(START, "get_schema")
+    if model_router is not None:
+        builder.add_edge("get_schema", "route_model")
+        builder.add_edge("route_model", "generate_query")
+    else:
+        builder.add_edge("get_schema", "generate_query")
+    after_generate = "validate_query" if validate_queries else "execute_query"
+    escalate = model_router is not None
+    budget_retries = max_budget_retries if query_timeout else 0
+    after_execute = (["summarize_result", END] + (["fast_answer"] if fast_answers else [])
+                     + (["generate_query"] if escalate or budget_retries else []))
+    if speculative_candidates > 1:
+        builder.add_conditional_edges(
+            "generate_query",
+            lambda state: route_after_generate(state, fast_answers, validate_queries, escalate, budget_retries),
+            [after_generate] + after_execute,
+        )
+    else:
+        builder.add_edge("generate_query", after_generate)
+    if validate_queries:
+        builder.add_conditional_edges("validate_query", lambda state: route_after_validate(state, max_validation_retries),
+                                      ["generate_query", "execute_query"])
+    builder.add_conditional_edges(
+        "execute_query",
+        lambda state: route_after_execute(state, fast_answers, escalate, budget_retries),
+        after_execute,
+    )
+    if fast_answers:
+        builder.add_edge("fast_answer", END)
     builder.add_edge("summarize_result", END)
 
-    return builder.compile()
+    graph = builder.compile()
+    graph.schema_refresher = schema_refresher
+    return graph
@@ -1,10 +1,20 @@
 # app/app.py
 
 import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from langchain_core.messages import HumanMessage
 from utils import get_db_connection
-from agent import create_sql_agent_graph
-from llm_config import get_llm
+from agent import create_sql_agent_graph, load_schema_catalog
+from llm_config import get_llm, llm_registry
+from model_router import ModelRouter
+from query_cache import QuestionCache
+from query_budget import CancelHandle
+from query_result import QueryResult
+from result_cache import ResultCache
+from schema_cache import DEFAULT_CACHE_DIR
+from schema_refresh import SchemaRefresher
+from semantic_cache import SemanticQuestionCache
 
 st.set_page_config(page_title="SQL Chatbot", layout="wide")
 st.title("💬 SQL Chat with LLM + LangGraph")
@@ -17,31 +27,155 @@ model_name = st.sidebar.text_input(
     "llama3.1" if provider == "ollama" else "gpt-4"
 )
 temperature = st.sidebar.slider("Temperature", 0.0, 1.0, 0.0)
+small_model_name = st.sidebar.text_input("Small model for simple questions (optional)", "")
+hedge_provider = st.sidebar.selectbox("Hedge slow requests with", ["none", "openai", "ollama"])
+hedge = None
+if hedge_provider != "none":
+    hedge = {
+        "provider": hedge_provider,
+        "model_name": st.sidebar.text_input("Hedge model name", "llama3.1" if hedge_provider == "ollama" else "gpt-4o-mini"),
+        "temperature": temperature,
+        "percentile": st.sidebar.slider("Hedge after primary latency percentile", 50, 99, 95),
+    }
 db_uri = st.sidebar.text_input("Database URI", "sqlite:///Chinook.db")
+lazy_schema = st.sidebar.checkbox("Lazy schema loading (very large databases)", False)
 
 # --- Initialize ---
+@st.cache_resource
+def get_question_cache():
+    # Shared by every session so repeated questions skip the LLM across users.
+    return QuestionCache(".schema_cache/questions.json")
+
+
+@st.cache_resource
+def get_semantic_cache():
+    return SemanticQuestionCache()
+
+
+@st.cache_resource
+def get_result_cache():
+    # Shared so repeated queries from any session skip the database until the data changes.
+    return ResultCache()
+
+
+@st.cache_resource
+def get_database(uri):
+    # One connection pool per database for all sessions.
+    return get_db_connection(uri)
+
+
+@st.cache_resource
+def get_schema_catalog(uri, lazy):
+    # One schema snapshot and one refresher thread per database, instead of one per session.
+    db = get_database(uri)
+    catalog = load_schema_catalog(db, DEFAULT_CACHE_DIR, lazy_schema=lazy)
+    # Refreshed schemas are written back to the same cache, so restarts don't re-reflect them.
+    SchemaRefresher(db, catalog, poll_interval=30, cache_dir=DEFAULT_CACHE_DIR).start()
+    return catalog
+
+
+def release_ended_sessions():
+    # Streamlit has no session-end hook; forget registry sessions whose browser tab is gone.
+    if not runtime.exists():
+        return
+    active = runtime.get_instance()
+    for session_id in llm_registry.sessions():
+        if not active.is_active_session(session_id):
+            llm_registry.release(session_id)
+
+
+if "session_id" not in st.session_state:
+    # Streamlit's own id, so release_ended_sessions can tell when this session ends.
+    st.session_state.session_id = get_script_run_ctx().session_id
+    release_ended_sessions()
+
 if "agent" not in st.session_state:
-    db = get_db_connection(db_uri)
+    db = get_database(db_uri)
     if db is None:
         st.error("❌ Could not connect to database.")
         st.stop()
 
-    llm = get_llm(provider, model_name=model_name, temperature=temperature)
-    agent = create_sql_agent_graph(llm, db)
+    # Shared, connection-pooled client; sessions with the same settings reuse it.
+    llm = get_llm(provider, session_id=st.session_state.session_id, model_name=model_name, temperature=temperature,
+                  hedge=hedge)
+    model_router = None
+    if small_model_name:
+        small_llm = get_llm(provider, session_id=st.session_state.session_id, model_name=small_model_name,
+                            temperature=temperature)
+        model_router = ModelRouter(small_llm, llm)
+    agent = create_sql_agent_graph(llm, db, schema_catalog=get_schema_catalog(db_uri, lazy_schema),
+                                   value_index_dir=".schema_cache", question_cache=get_question_cache(),
+                                   semantic_cache=get_semantic_cache(), model_router=model_router,
+                                   result_cache=get_result_cache())
     st.session_state.agent = agent
+    st.session_state.model_router = model_router
     st.session_state.history = []
 
+with st.sidebar.expander("LLM connections"):
+    for client in llm_registry.stats():
+        st.caption(
+            f"{client['provider']}/{client['model']} @ {client['temperature']}: {client['sessions']} sessions, "
+            f"{client['requests']} requests, {client['reuse_rate']:.0%} on reused connections"
+        )
+    for hedged in llm_registry.hedge_stats():
+        st.caption(
+            f"{hedged['model']}: {hedged['calls']} calls, {hedged['hedge_rate']:.0%} hedged, secondary won "
+            f"{hedged['secondary_win_rate']:.0%} of hedges, hedge delay {hedged['hedge_delay_ms']:.0f} ms"
+        )
+    for limited_provider, limits in llm_registry.rate_limit_stats().items():
+        st.caption(
+            f"{limited_provider} scheduler: {limits['admitted']} admitted, {limits['queued']} queued, "
+            f"{limits['rate_limited']} rate-limit responses, avg wait {limits['avg_wait_ms']:.0f} ms"
+        )
+
+with st.sidebar.expander("Result cache"):
+    cached = get_result_cache().stats()
+    st.caption(
+        f"{cached['size']} results ({cached['bytes'] / 1e6:.1f} MB), {cached['hit_rate']:.0%} hit rate, "
+        f"{cached['invalidations']} invalidated by data changes, {cached['evictions']} evicted"
+    )
+
+if st.session_state.get("model_router") is not None:
+    routing = st.session_state.model_router.stats.snapshot()
+    with st.sidebar.expander("Model routing"):
+        st.caption(f"Routed: {routing['routed']}, escalation rate {routing['escalation_rate']:.0%}")
+        for route, latency in routing["generate_ms"].items():
+            st.caption(f"{route}: p50 {latency['p50']:.0f} ms, p95 {latency['p95']:.0f} ms over {latency['calls']} calls")
+
 # --- Chat Input ---
 user_input = st.text_input("Ask me anything about the database:")
 
-if user_input:
+def cancel_running_query():
+    # Runs at the start of the rerun triggered by the button, while the previous run may still be executing.
+    handle = st.session_state.get("cancel_handle")
+    if handle is not None:
+        handle.cancel()
+    st.session_state.query_cancelled = True
+
+
+if st.session_state.pop("query_cancelled", False):
+    st.info("Query cancelled.")
+elif user_input:
+    st.session_state.cancel_handle = CancelHandle()
+    st.button("⏹ Cancel query", on_click=cancel_running_query)
     with st.spinner("🔍 Thinking..."):
         initial_state = {
             "user_question": user_input,
             "messages": [HumanMessage(content=user_input)]
         }
 
-        result_state = st.session_state.agent.invoke(initial_state)
+        # Stream the final answer token by token while keeping the last full state.
+        answer_placeholder = st.empty()
+        streamed_answer = ""
+        result_state = {}
+        config = {"configurable": {"cancel_handle": st.session_state.cancel_handle}}
+        for mode, chunk in st.session_state.agent.stream(initial_state, config, stream_mode=["custom", "values"]):
+            if mode == "custom" and "answer_token" in chunk:
+                streamed_answer += chunk["answer_token"]
+                answer_placeholder.markdown(f"**Final Answer:**\n{streamed_answer}▌")
+            elif mode == "values":
+                result_state = chunk
+        answer_placeholder.empty()
 
         sql_query = result_state.get("sql_query", "")
         query_result = result_state.get("query_result", "")
@@ -51,6 +185,7 @@ if user_input:
             "question": user_input,
             "sql": sql_query,
             "result": query_result,
+            "result_note": result_state.get("result_note", ""),
             "answer": final_answer
         })
 
@@ -59,6 +194,11 @@ for chat in st.session_state.history[::-1]:
     with st.expander(f"❓ {chat['question']}"):
         if chat["sql"]:
             st.markdown(f"**Generated SQL:**\n```sql\n{chat['sql']}\n```")
-        if chat["result"]:
+        if isinstance(chat["result"], QueryResult) and chat["result"].columns:
+            st.markdown("**Query Result:**")
+            st.dataframe(chat["result"].to_dataframe(), hide_index=True)
+        elif chat["result"]:
             st.markdown(f"**Query Result:**\n{chat['result']}")
+        if chat.get("result_note"):
+            st.caption(chat["result_note"])
         st.markdown(f"**Final Answer:**\n{chat['answer']}")
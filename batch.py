@@ -0,0 +1,176 @@
+# app/batch.py
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List, Set, Tuple
+
+from langchain_core.messages import HumanMessage
+
+logger = logging.getLogger(__name__)
+
+
+def read_questions(path: str) -> Iterator[Tuple[str, str]]:
+    """Yields (id, question) from a JSONL file without loading it whole."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            question = record.get("question") or record.get("user_question")
+            if not question:
+                logger.warning(f"Skipping line {line_no}: no 'question' field")
+                continue
+            yield str(record.get("id", record.get("request_id", line_no))), question
+
+
+def completed_ids(path: str) -> Set[str]:
+    """Ids already answered successfully in an existing output file (for resume)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a torn last line from an interrupted run
+            if "error" not in record:
+                done.add(record["id"])
+    return done
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def answer_question(agent, question: str) -> Tuple[Dict, Dict[str, float]]:
+    """Runs one question through the graph, timing each node from its update event."""
+    state: Dict = {"user_question": question, "messages": [HumanMessage(content=question)]}
+    stages: Dict[str, float] = {}
+    last = time.perf_counter()
+    async for update in agent.astream(state, stream_mode="updates"):
+        now = time.perf_counter()
+        for node, values in update.items():
+            stages[node] = stages.get(node, 0.0) + (now - last) * 1000
+            if values:
+                for key, value in values.items():
+                    if key == "metrics":
+                        state.setdefault("metrics", {}).update(value)
+                    elif key != "messages":
+                        state[key] = value
+        last = now
+    return state, stages
+
+
+async def run_batch(agent, input_path: str, output_path: str, concurrency: int = 4) -> Dict:
+    """
+    Answers every question in input_path not yet in output_path with at most
+    `concurrency` in flight, appending one JSON line per answer as it finishes.
+    """
+    done = completed_ids(output_path)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    counts = {"answered": 0, "failed": 0, "skipped": 0}
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                qid, question = item
+                start = time.perf_counter()
+                record = {"id": qid, "question": question}
+                try:
+                    state, stages = await answer_question(agent, question)
+                    record.update({
+                        "sql": state.get("sql_query", ""),
+                        "result": str(state.get("query_result", "")),
+                        "answer": state.get("final_answer", ""),
+                        "stages_ms": stages,
+                    })
+                    for stage, ms in stages.items():
+                        latencies[stage].append(ms)
+                    counts["answered"] += 1
+                except Exception as e:
+                    record["error"] = str(e)
+                    counts["failed"] += 1
+                    logger.error(f"Question {qid} failed: {e}")
+                record["total_ms"] = (time.perf_counter() - start) * 1000
+                latencies["total"].append(record["total_ms"])
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+
+        started = time.perf_counter()
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        for qid, question in read_questions(input_path):
+            if qid in done:
+                counts["skipped"] += 1
+                continue
+            await queue.put((qid, question))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        elapsed = time.perf_counter() - started
+
+    processed = counts["answered"] + counts["failed"]
+    return {
+        **counts,
+        "elapsed_s": elapsed,
+        "questions_per_s": processed / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            stage: {f"p{p}": percentile(values, p) for p in (50, 90, 99)}
+            for stage, values in latencies.items()
+        },
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(
+        f"Answered {report['answered']}, failed {report['failed']}, skipped {report['skipped']} "
+        f"in {report['elapsed_s']:.1f}s ({report['questions_per_s']:.2f} questions/s)"
+    )
+    print(f"{'stage':<20}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for stage, pcts in report["latency_ms"].items():
+        print(f"{stage:<20}{pcts['p50']:>10.1f}{pcts['p90']:>10.1f}{pcts['p99']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions through the SQL agent.")
+    parser.add_argument("input", help="JSONL with one {'id': ..., 'question': ...} per line")
+    parser.add_argument("output", help="JSONL to append answers to; existing answers are skipped (resume)")
+    parser.add_argument("--db", default="sqlite:///Chinook.db", help="Database URI")
+    parser.add_argument("--provider", default="ollama", choices=["ollama", "openai"])
+    parser.add_argument("--model", default=None, help="Model name (provider default if omitted)")
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions in flight at once")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    from agent import create_sql_agent_graph
+    from llm_config import get_llm
+    from utils import get_db_connection
+
+    db = get_db_connection(args.db)
+    if db is None:
+        raise SystemExit(f"Could not connect to {args.db}")
+    llm_kwargs = {"temperature": args.temperature}
+    if args.model:
+        llm_kwargs["model_name"] = args.model
+    agent = create_sql_agent_graph(get_llm(args.provider, **llm_kwargs), db)
+    print_report(asyncio.run(run_batch(agent, args.input, args.output, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
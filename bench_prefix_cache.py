@@ -0,0 +1,102 @@
+# app/bench_prefix_cache.py
+
+import argparse
+import logging
+import statistics
+from typing import Dict, List
+
+from langchain_core.messages import HumanMessage
+from langchain_ollama import ChatOllama
+
+from agent import build_generation_prompt, get_schema_node
+from schema_cache import load_schema_description
+from schema_refresh import SchemaCatalog
+from utils import get_db_connection
+
+DEFAULT_QUESTIONS = [
+    "How many tracks are there in each genre?",
+    "Which artist has the most albums?",
+    "What are the ten longest tracks?",
+    "Which customers spent the most money?",
+    "How many invoices were issued per country?",
+    "Which employees support the most customers?",
+    "What is the average track length per album?",
+    "Which playlists contain the most tracks?",
+]
+
+
+def question_first_prompt(state: Dict) -> List:
+    """The previous layout: question before the schema, one user message."""
+    return [HumanMessage(content=f"""
+You are a SQL expert. Based on the user's question and the database schema,
+generate ONLY a syntactically correct SQL query.
+
+User Question:
+{state['user_question']}
+
+Schema:
+{state['schema']}
+
+Output ONLY the SQL query, no explanation, no commentary.
+""")]
+
+
+def measure(llm, prompts: List[List]) -> List[Dict]:
+    """Sends prompts back to back and reads Ollama's prefill counters from each response."""
+    samples = []
+    for messages in prompts:
+        meta = llm.invoke(messages).response_metadata
+        samples.append({
+            "prompt_tokens": meta.get("prompt_eval_count") or 0,
+            "prefill_ms": (meta.get("prompt_eval_duration") or 0) / 1e6,
+        })
+    return samples
+
+
+def report(name: str, samples: List[Dict]) -> float:
+    # The first call of each run is cold for both layouts.
+    warm = samples[1:] or samples
+    prefill = statistics.mean(s["prefill_ms"] for s in warm)
+    tokens = statistics.mean(s["prompt_tokens"] for s in warm)
+    print(f"{name:<16}{tokens:>14.0f}{prefill:>14.1f}")
+    return prefill
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare Ollama prefill time of the question-first and prefix-stable prompt layouts.")
+    parser.add_argument("--db", default="sqlite:///Chinook.db", help="Database URI")
+    parser.add_argument("--model", default="llama3.1")
+    parser.add_argument("--base-url", default=None, help="Ollama URL (OLLAMA_HOST if omitted)")
+    parser.add_argument("--top-k", type=int, default=5, help="Tables selected per question")
+    parser.add_argument("--rounds", type=int, default=2, help="Passes over the question list per layout")
+    parser.add_argument("questions", nargs="*", help="Questions to ask (a Chinook set if omitted)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    db = get_db_connection(args.db)
+    if db is None:
+        raise SystemExit(f"Could not connect to {args.db}")
+    fingerprint, tables = load_schema_description(db)
+    snapshot = SchemaCatalog(fingerprint, tables).snapshot()
+
+    states = []
+    for question in (args.questions or DEFAULT_QUESTIONS) * args.rounds:
+        state = {"user_question": question}
+        state.update(get_schema_node(state, snapshot, top_k_tables=args.top_k))
+        states.append(state)
+
+    # num_predict=1: only the prefill is of interest.
+    kwargs = {"base_url": args.base_url} if args.base_url else {}
+    llm = ChatOllama(model=args.model, temperature=0, num_predict=1, keep_alive="30m", **kwargs)
+    llm.invoke("warm up")
+
+    print(f"{'layout':<16}{'prompt tokens':>14}{'prefill ms':>14}")
+    before = report("question-first", measure(llm, [question_first_prompt(s) for s in states]))
+    after = report("prefix-stable", measure(llm, [build_generation_prompt(s) for s in states]))
+    if before:
+        print(f"Prefill saved per question: {before - after:.1f} ms ({100 * (1 - after / before):.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# app/bench_schema_reflection.py
+
+import argparse
+import copy
+import logging
+import statistics
+import threading
+import time
+from typing import Callable, Dict
+
+from langchain_community.utilities.sql_database import SQLDatabase
+from sqlalchemy import MetaData, event
+
+from schema_cache import describe_tables, render_schema
+from utils import get_db_connection
+
+
+class StatementCounter:
+    """Counts statements sent to the database, optionally adding a simulated network round trip to each."""
+
+    def __init__(self, db: SQLDatabase, latency: float = 0.0):
+        self.count = 0
+        self.latency = latency
+        self._lock = threading.Lock()
+        event.listen(db._engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *_) -> None:
+        with self._lock:
+            self.count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def cold(db: SQLDatabase) -> SQLDatabase:
+    """A copy of db with an empty MetaData, as on a cold start without the schema cache."""
+    fresh = copy.copy(db)
+    fresh._metadata = MetaData()
+    return fresh
+
+
+def measure(db: SQLDatabase, counter: StatementCounter, describe: Callable[[SQLDatabase], str],
+            rounds: int) -> Dict:
+    timings = []
+    for _ in range(rounds):
+        before = counter.count
+        start = time.perf_counter()
+        output = describe(cold(db))
+        timings.append((time.perf_counter() - start) * 1000)
+        statements = counter.count - before
+    return {"ms": statistics.median(timings), "statements": statements, "output": output}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare serial get_table_info with describe_tables on a thread pool (cold schema).")
+    parser.add_argument("--db", default="sqlite:///Chinook.db", help="Database URI")
+    parser.add_argument("--workers", default="1,4,8", help="Comma-separated describe_tables worker counts")
+    parser.add_argument("--rounds", type=int, default=5, help="Runs per configuration (median reported)")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="Simulated round trip per statement, as for a database across the network "
+                             "(a local SQLite file has none, so threads can't overlap any waiting)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    db = get_db_connection(args.db)
+    if db is None:
+        raise SystemExit(f"Could not connect to {args.db}")
+    counter = StatementCounter(db, args.latency_ms / 1000)
+    names = db.get_usable_table_names()
+
+    baseline = measure(db, counter, lambda d: d.get_table_info(), args.rounds)
+    print(f"{'method':<24}{'ms':>10}{'statements':>12}{'speedup':>10}")
+    print(f"{'get_table_info (serial)':<24}{baseline['ms']:>10.1f}{baseline['statements']:>12}{1:>10.2f}x")
+    for workers in (int(w) for w in args.workers.split(",")):
+        result = measure(db, counter, lambda d: render_schema(describe_tables(d, names, workers)),
+                         args.rounds)
+        same = "" if result["output"] == baseline["output"] else "  (output differs!)"
+        print(f"{f'describe_tables x{workers}':<24}{result['ms']:>10.1f}{result['statements']:>12}"
+              f"{baseline['ms'] / result['ms']:>10.2f}x{same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# app/bench_sqlite_pool.py
+
+import argparse
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from result_stream import ResultLimits, stream_query
+from utils import get_db_connection
+
+DEFAULT_QUERIES = [
+    "SELECT g.Name, COUNT(*) FROM Track t JOIN Genre g ON t.GenreId = g.GenreId GROUP BY g.Name",
+    "SELECT BillingCountry, SUM(Total) FROM Invoice GROUP BY BillingCountry ORDER BY 2 DESC",
+    "SELECT ar.Name, COUNT(*) FROM Album al JOIN Artist ar ON al.ArtistId = ar.ArtistId "
+    "GROUP BY ar.Name ORDER BY 2 DESC LIMIT 10",
+    "SELECT c.LastName, SUM(il.UnitPrice * il.Quantity) FROM Customer c JOIN Invoice i ON c.CustomerId = i.CustomerId "
+    "JOIN InvoiceLine il ON i.InvoiceId = il.InvoiceId GROUP BY c.CustomerId ORDER BY 2 DESC LIMIT 5",
+    "SELECT AlbumId, AVG(Milliseconds) FROM Track GROUP BY AlbumId",
+    "SELECT * FROM Track WHERE Name LIKE '%love%'",
+]
+
+
+def run(db: SQLDatabase, queries: List[str], threads: int, duration: float) -> Dict:
+    """Runs the queries round-robin from `threads` workers for `duration` seconds, like concurrent sessions."""
+    latencies: List[float] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(offset: int) -> None:
+        local = []
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            stream_query(db, queries[i % len(queries)], ResultLimits())
+            local.append((time.perf_counter() - start) * 1000)
+            i += 1
+        with lock:
+            latencies.extend(local)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return {"qps": len(latencies) / duration, "latencies": latencies}
+
+
+def summarize(runs: List[Dict]) -> Dict:
+    latencies = sorted(ms for r in runs for ms in r["latencies"])
+    return {
+        "qps": statistics.median(r["qps"] for r in runs),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare concurrent read throughput of the default SQLite engine and the read-only pool.")
+    parser.add_argument("--db", default="sqlite:///Chinook.db", help="SQLite database URI")
+    parser.add_argument("--threads", default="1,4,8", help="Comma-separated worker counts")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per round")
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="Rounds per configuration, alternating engines to even out machine noise")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    engines = {
+        "default": get_db_connection(args.db, sqlite_read_only=False),
+        "read-only pool": get_db_connection(args.db),
+    }
+    for name, db in engines.items():
+        if db is None:
+            raise SystemExit(f"Could not connect to {args.db}")
+        run(db, DEFAULT_QUERIES, 1, 0.5)  # warm up the OS page cache and the pool
+
+    print(f"{'engine':<16}{'threads':>8}{'queries/s':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for threads in (int(t) for t in args.threads.split(",")):
+        runs = {name: [] for name in engines}
+        for _ in range(args.rounds):
+            for name, db in engines.items():
+                runs[name].append(run(db, DEFAULT_QUERIES, threads, args.duration))
+        results = {name: summarize(r) for name, r in runs.items()}
+        for name, r in results.items():
+            print(f"{name:<16}{threads:>8}{r['qps']:>12.0f}{r['p50']:>10.2f}{r['p95']:>10.2f}")
+        print(f"{'':<24}speedup {results['read-only pool']['qps'] / results['default']['qps']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# app/fast_answer.py
+
+import math
+from typing import Optional, Sequence, Union
+
+from query_result import QueryResult
+
+MAX_FAST_ROWS = 10
+MAX_FAST_COLUMNS = 4
+
+
+def format_value(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return f"{value:,}" if abs(value) >= 10000 else str(value)
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return str(value)
+        return f"{value:,.2f}" if value != int(value) else f"{int(value):,}"
+    return str(value)
+
+
+def _format_row(row: Sequence) -> str:
+    return " | ".join(format_value(v) for v in row)
+
+
+def _label(column: str) -> Optional[str]:
+    """A column name usable in prose ("total_sales" -> "total sales"), None for expressions like COUNT(*)."""
+    if column[:1].isalpha() and column.replace("_", "").isalnum():
+        return column.replace("_", " ")
+    return None
+
+
+def render_fast_answer(query_result: Union[QueryResult, str], max_rows: int = MAX_FAST_ROWS,
+                       max_columns: int = MAX_FAST_COLUMNS) -> Optional[str]:
+    """
+    Renders an answer for empty, scalar, single-row and small tabular results
+    without an LLM. Returns None when the result needs a prose summary.
+    """
+    if not isinstance(query_result, QueryResult):
+        return None
+    if len(query_result) == 0:
+        return "The query returned no matching rows."
+    columns = query_result.columns
+    width = len(columns)
+    if width == 0 or width > max_columns or len(query_result) > max_rows:
+        return None
+    rows = query_result.rows()
+    labels = [_label(c) for c in columns]
+    if len(rows) == 1 and width == 1:
+        if labels and labels[0]:
+            return f"The {labels[0]} is {format_value(rows[0][0])}."
+        return f"The answer is {format_value(rows[0][0])}."
+    if len(rows) == 1:
+        if labels and all(labels):
+            return "The result is: " + ", ".join(f"{l} {format_value(v)}" for l, v in zip(labels, rows[0])) + "."
+        return f"The result is: {_format_row(rows[0])}."
+    lines = "\n".join(f"- {_format_row(row)}" for row in rows)
+    header = f"({_format_row(columns)})\n" if all(labels) else ""
+    return f"The query returned {len(rows)} rows:\n{header}{lines}"
@@ -0,0 +1,253 @@
+# app/hedging.py
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream, generate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the first-token latency histogram buckets; the last one is open.
+HISTOGRAM_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+_DONE = object()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class HedgeStats:
+    """Hedge/win counters and first-token latency histograms per provider."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.wins = {"primary": 0, "secondary": 0}
+        self.failures = 0
+        self.histograms = {name: [0] * (len(HISTOGRAM_BUCKETS_MS) + 1) for name in self.wins}
+
+    def record(self, winner: Optional[str], hedged: bool, first_token_ms: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.hedged += hedged
+            if winner is None:
+                self.failures += 1
+                return
+            self.wins[winner] += 1
+            self.histograms[winner][bisect_left(HISTOGRAM_BUCKETS_MS, first_token_ms)] += 1
+
+    def snapshot(self) -> Dict:
+        labels = [f"<={b}ms" for b in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_rate": self.hedged / self.calls if self.calls else 0.0,
+                "wins": dict(self.wins),
+                "secondary_win_rate": self.wins["secondary"] / self.hedged if self.hedged else 0.0,
+                "failures": self.failures,
+                "first_token_ms": {name: dict(zip(labels, counts)) for name, counts in self.histograms.items()},
+            }
+
+
+def _model_name(llm) -> Optional[str]:
+    """Model name of a client, looking through wrappers (rate limiting, nested hedges) that expose `inner`."""
+    while hasattr(llm, "inner"):
+        llm = llm.inner
+    return getattr(llm, "model", None) or getattr(llm, "model_name", None)
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    Chat model that sends each request to `primary` and, if no token has
+    arrived after a delay derived from the primary's observed first-token
+    latency percentile, sends the same request to `secondary`. The first
+    provider to produce a token wins and the other request is cancelled
+    (async) or abandoned after its next chunk (sync). A primary error before
+    the hedge fires falls back to the secondary immediately.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    primary: Any
+    secondary: Any
+    percentile: float = 95.0
+    initial_delay: float = 2.0
+    min_delay: float = 0.05
+    min_samples: int = 20
+    window: int = 500
+
+    _latencies: deque = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _stats: HedgeStats = PrivateAttr(default_factory=HedgeStats)
+
+    def model_post_init(self, __context) -> None:
+        self._latencies = deque(maxlen=self.window)
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def model(self) -> str:
+        return f"hedged({_model_name(self.primary)}, {_model_name(self.secondary)})"
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary's first token before hedging."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_delay
+            return max(self.min_delay, _percentile(list(self._latencies), self.percentile))
+
+    def stats(self) -> Dict:
+        return {**self._stats.snapshot(), "hedge_delay_ms": self.hedge_delay() * 1000}
+
+    def _finish(self, winner: Optional[str], hedged: bool, start: float, first_token_at: Optional[float]) -> None:
+        first_token_ms = ((first_token_at or time.perf_counter()) - start) * 1000
+        if winner == "primary":
+            with self._lock:
+                self._latencies.append(first_token_ms / 1000)
+        self._stats.record(winner, hedged, first_token_ms)
+        if hedged:
+            logger.info(f"Hedged LLM call: {winner or 'no provider'} won, first token after {first_token_ms:.0f} ms")
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        events: "queue.Queue" = queue.Queue()
+        cancelled = {"primary": threading.Event(), "secondary": threading.Event()}
+
+        def pump(name: str, model) -> None:
+            try:
+                for chunk in model.stream(messages, stop=stop, **kwargs):
+                    if cancelled[name].is_set():
+                        return
+                    events.put((name, chunk))
+                events.put((name, _DONE))
+            except Exception as e:
+                events.put((name, e))
+
+        launched, running = set(), set()
+
+        def launch(name: str) -> None:
+            model = self.primary if name == "primary" else self.secondary
+            launched.add(name)
+            running.add(name)
+            threading.Thread(target=pump, args=(name, model), name=f"hedge-{name}", daemon=True).start()
+
+        start = time.perf_counter()
+        deadline = start + self.hedge_delay()
+        launch("primary")
+        winner, first_token_at = None, None
+        try:
+            while True:
+                timeout = None
+                if winner is None and "secondary" not in launched:
+                    timeout = max(0.0, deadline - time.perf_counter())
+                try:
+                    name, item = events.get(timeout=timeout)
+                except queue.Empty:
+                    launch("secondary")
+                    continue
+                if winner is None:
+                    if isinstance(item, Exception):
+                        running.discard(name)
+                        logger.warning(f"Hedged LLM: {name} failed before its first token: {item!r}")
+                        if name == "primary" and "secondary" not in launched:
+                            launch("secondary")
+                        if not running:
+                            raise item
+                        continue
+                    winner, first_token_at = name, time.perf_counter()
+                    for other in running - {name}:
+                        cancelled[other].set()
+                if name != winner:
+                    continue
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield ChatGenerationChunk(message=item)
+        finally:
+            for event in cancelled.values():
+                event.set()
+            self._finish(winner, "secondary" in launched, start, first_token_at)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def pump(name: str, model) -> None:
+            try:
+                async for chunk in model.astream(messages, stop=stop, **kwargs):
+                    await events.put((name, chunk))
+                await events.put((name, _DONE))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await events.put((name, e))
+
+        tasks: Dict[str, asyncio.Task] = {}
+        running = set()
+
+        def launch(name: str) -> None:
+            model = self.primary if name == "primary" else self.secondary
+            running.add(name)
+            tasks[name] = asyncio.create_task(pump(name, model))
+
+        start = time.perf_counter()
+        deadline = start + self.hedge_delay()
+        launch("primary")
+        winner, first_token_at = None, None
+        try:
+            while True:
+                timeout = None
+                if winner is None and "secondary" not in tasks:
+                    timeout = max(0.0, deadline - time.perf_counter())
+                try:
+                    name, item = await asyncio.wait_for(events.get(), timeout)
+                except asyncio.TimeoutError:
+                    launch("secondary")
+                    continue
+                if winner is None:
+                    if isinstance(item, Exception):
+                        running.discard(name)
+                        logger.warning(f"Hedged LLM: {name} failed before its first token: {item!r}")
+                        if name == "primary" and "secondary" not in tasks:
+                            launch("secondary")
+                        if not running:
+                            raise item
+                        continue
+                    winner, first_token_at = name, time.perf_counter()
+                    for other in running - {name}:
+                        tasks[other].cancel()
+                if name != winner:
+                    continue
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield ChatGenerationChunk(message=item)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            self._finish(winner, "secondary" in tasks, start, first_token_at)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop=stop, **kwargs))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                         **kwargs: Any) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, **kwargs))
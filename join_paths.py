@@ -0,0 +1,98 @@
+# app/join_paths.py
+
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class JoinEdge(NamedTuple):
+    left_table: str
+    left_columns: Tuple[str, ...]
+    right_table: str
+    right_columns: Tuple[str, ...]
+
+    def condition(self) -> str:
+        return " AND ".join(
+            f"{self.left_table}.{lc} = {self.right_table}.{rc}"
+            for lc, rc in zip(self.left_columns, self.right_columns)
+        )
+
+
+class JoinGraph:
+    """
+    Undirected graph of tables connected by foreign keys, with shortest join
+    paths precomputed from every table (BFS parent pointers, O(V * (V + E))).
+    """
+
+    def __init__(self, tables: Dict[str, "TableInfo"]):
+        self.adjacency: Dict[str, List[Tuple[str, JoinEdge]]] = {name: [] for name in tables}
+        for info in tables.values():
+            for columns, ref_table, ref_columns in info.foreign_keys:
+                if ref_table not in self.adjacency or ref_table == info.name:
+                    continue
+                edge = JoinEdge(info.name, tuple(columns), ref_table, tuple(ref_columns))
+                self.adjacency[info.name].append((ref_table, edge))
+                self.adjacency[ref_table].append((info.name, edge))
+        for neighbours in self.adjacency.values():
+            neighbours.sort(key=lambda item: item[0])
+
+        self._parents: Dict[str, Dict[str, Optional[Tuple[str, JoinEdge]]]] = {
+            source: self._bfs(source) for source in self.adjacency
+        }
+
+    def _bfs(self, source: str) -> Dict[str, Optional[Tuple[str, JoinEdge]]]:
+        parents: Dict[str, Optional[Tuple[str, JoinEdge]]] = {source: None}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for neighbour, edge in self.adjacency[node]:
+                if neighbour not in parents:
+                    parents[neighbour] = (node, edge)
+                    queue.append(neighbour)
+        return parents
+
+    def shortest_path(self, source: str, target: str) -> Optional[List[JoinEdge]]:
+        """Returns the FK edges joining source to target, or None if unconnected."""
+        parents = self._parents.get(source, {})
+        if target not in parents:
+            return None
+        path = []
+        node = target
+        while parents[node] is not None:
+            node, edge = parents[node]
+            path.append(edge)
+        return path[::-1]
+
+    def connect(self, tables: List[str]) -> Tuple[List[str], List[JoinEdge]]:
+        """
+        Greedily links the given tables (shortest path from the connected set to
+        each next table). Returns every table on the paths, including bridge
+        tables, and the join edges to use. Unreachable tables stay unjoined.
+        """
+        tables = [t for t in tables if t in self.adjacency]
+        if not tables:
+            return [], []
+        connected = [tables[0]]
+        edges: List[JoinEdge] = []
+        for target in tables[1:]:
+            if target in connected:
+                continue
+            best = None
+            for source in connected:
+                path = self.shortest_path(source, target)
+                if path is not None and (best is None or len(path) < len(best)):
+                    best = path
+            if best is None:
+                connected.append(target)
+                continue
+            for edge in best:
+                if edge not in edges:
+                    edges.append(edge)
+                for name in (edge.left_table, edge.right_table):
+                    if name not in connected:
+                        connected.append(name)
+        return connected, edges
+
+
+def describe_join_paths(edges: List[JoinEdge]) -> str:
+    """Renders join edges as one ON condition per line for the generation prompt."""
+    return "\n".join(edge.condition() for edge in edges)
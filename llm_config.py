@@ -1,13 +1,270 @@
 # app/llm_config.py
 
-from langchain_community.llms import Ollama
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Set, Tuple
 
-from langchain_openai import OpenAI  # or whatever the library is
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_ollama import ChatOllama
+from langchain_openai import ChatOpenAI
 
-def get_llm(provider: str, **kwargs):
+from hedging import HedgedChatModel
+from rate_limit import LLMScheduler, RateLimitedChatModel
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODELS = {"ollama": "llama3.1", "openai": "gpt-4", "fake": "fake"}
+# Keys of get_llm's `hedge` dict that configure the hedge instead of the secondary client.
+HEDGE_SETTINGS = ("percentile", "initial_delay", "min_delay", "min_samples")
+# Scheduler session that hedged (secondary) requests of every session queue under.
+HEDGE_SESSION = "hedge"
+# Per-provider account budgets enforced by the process-wide scheduler; providers
+# without an entry (e.g. a local Ollama) are not throttled.
+RATE_LIMITS = {
+    "openai": {
+        "requests_per_minute": float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500")),
+        "tokens_per_minute": float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "30000")),
+    },
+}
+# How long Ollama keeps the model (and its prompt KV cache) loaded between calls.
+DEFAULT_KEEP_ALIVE = "30m"
+# Keep-alive pool shared by every session using the same client.
+POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=300)
+
+
+class ConnectionStats:
+    """
+    Counts HTTP requests and newly opened TCP connections of one client pool.
+    The request event hook attaches an httpcore trace callback, so every
+    request that doesn't open a connection reused a pooled one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def _count(self, event: str) -> None:
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections_opened += 1
+
+    def on_request(self, request: httpx.Request) -> None:
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = lambda event, info: self._count(event)
+
+    async def aon_request(self, request: httpx.Request) -> None:
+        async def trace(event, info):
+            self._count(event)
+
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = trace
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            reused = max(0, self.requests - self.connections_opened)
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": reused,
+                "reuse_rate": reused / self.requests if self.requests else 0.0,
+            }
+
+
+def _create_llm(provider: str, model: str, temperature: float, options: Dict, stats: ConnectionStats):
+    sync_http = {"limits": POOL_LIMITS, "event_hooks": {"request": [stats.on_request]}}
+    async_http = {"limits": POOL_LIMITS, "event_hooks": {"request": [stats.aon_request]}}
     if provider == "ollama":
-        return Ollama(model=kwargs.get("model_name", "llama3.1"), temperature=kwargs.get("temperature", 0))
+        options.setdefault("keep_alive", DEFAULT_KEEP_ALIVE)
+        return ChatOllama(model=model, temperature=temperature, sync_client_kwargs=sync_http,
+                          async_client_kwargs=async_http, **options)
     elif provider == "openai":
-        return OpenAI(temperature=kwargs.get("temperature", 0), model=kwargs.get("model_name", "gpt-4"))
+        options.setdefault("stream_usage", True)  # real token counts for the rate limiter
+        return ChatOpenAI(model=model, temperature=temperature, http_client=httpx.Client(**sync_http),
+                      http_async_client=httpx.AsyncClient(**async_http), **options)
+    elif provider == "fake":
+        # Local canned responses; `sleep` (seconds per token) simulates a slow provider.
+        return FakeListChatModel(responses=options.pop("responses", ["SELECT 1"]), **options)
     else:
         raise ValueError(f"Unknown provider {provider}")
+
+
+class _RegisteredClient:
+    def __init__(self, llm, stats: ConnectionStats):
+        self.llm = llm
+        self.stats = stats
+        self.sessions: Set[str] = set()
+
+
+class LLMRegistry:
+    """
+    Process-wide registry handing out one shared client per (provider, model,
+    temperature, options), so every session reuses the same keep-alive HTTP
+    pool. LangChain clients hold no per-call state and are safe to share
+    between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple, _RegisteredClient] = {}
+        self._hedged: Dict[Tuple, HedgedChatModel] = {}
+        self._schedulers: Dict[str, LLMScheduler] = {}
+        self._limited: Dict[Tuple, RateLimitedChatModel] = {}
+        self._keys: Dict[int, Tuple] = {}
+
+    @staticmethod
+    def key(provider: str, model: str, temperature: float, options: Dict) -> Tuple:
+        return provider, model, float(temperature), tuple(sorted((k, repr(v)) for k, v in options.items()))
+
+    def get(self, provider: str, model: Optional[str] = None, temperature: float = 0,
+            session_id: Optional[str] = None, **options):
+        model = model or DEFAULT_MODELS.get(provider)
+        key = self.key(provider, model, temperature, options)
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                stats = ConnectionStats()
+                entry = _RegisteredClient(_create_llm(provider, model, temperature, dict(options), stats), stats)
+                self._clients[key] = entry
+                self._keys[id(entry.llm)] = key
+                logger.info(f"LLM registry: created {provider}/{model} client (temperature={temperature})")
+            if session_id is not None:
+                entry.sessions.add(session_id)
+            return entry.llm
+
+    def client_key(self, llm) -> Optional[Tuple]:
+        """Registry key of a shared client, None for clients built elsewhere."""
+        with self._lock:
+            return self._keys.get(id(llm))
+
+    def set_rate_limit(self, provider: str, requests_per_minute: float, tokens_per_minute: Optional[float] = None,
+                       **options) -> LLMScheduler:
+        """Replaces the provider's scheduler; applies to clients handed out afterwards."""
+        with self._lock:
+            scheduler = LLMScheduler(requests_per_minute, tokens_per_minute, **options)
+            self._schedulers[provider] = scheduler
+            return scheduler
+
+    def scheduler(self, provider: str) -> Optional[LLMScheduler]:
+        with self._lock:
+            if provider not in self._schedulers and provider in RATE_LIMITS:
+                self._schedulers[provider] = LLMScheduler(**RATE_LIMITS[provider])
+            return self._schedulers.get(provider)
+
+    def rate_limited(self, provider: str, llm, session_id: Optional[str]):
+        """Wraps a shared client so its calls queue under this session in the provider's scheduler."""
+        scheduler = self.scheduler(provider)
+        if scheduler is None:
+            return llm
+        key = (id(llm), id(scheduler), session_id or "default")
+        with self._lock:
+            model = self._limited.get(key)
+            if model is None:
+                model = RateLimitedChatModel(inner=llm, scheduler=scheduler, session=key[2])
+                self._limited[key] = model
+            return model
+
+    def rate_limit_stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            schedulers = dict(self._schedulers)
+        return {provider: scheduler.stats() for provider, scheduler in schedulers.items()}
+
+    def hedged(self, primary, secondary, **settings) -> HedgedChatModel:
+        """
+        Shared hedging wrapper over two registry clients (not per-session
+        wrappers), so its latency history is process-wide.
+        """
+        key = (id(primary), id(secondary), tuple(sorted(settings.items())))
+        with self._lock:
+            model = self._hedged.get(key)
+            if model is None:
+                model = HedgedChatModel(primary=primary, secondary=secondary, **settings)
+                self._hedged[key] = model
+            return model
+
+    def hedge_stats(self) -> List[Dict]:
+        with self._lock:
+            models = list(self._hedged.values())
+        return [{"model": model.model, **model.stats()} for model in models]
+
+    def release(self, session_id: str) -> None:
+        """Forgets a session and its rate-limited wrappers; clients stay pooled for the next one."""
+        with self._lock:
+            for entry in self._clients.values():
+                entry.sessions.discard(session_id)
+            for key in [k for k in self._limited if k[2] == session_id]:
+                del self._limited[key]
+
+    def sessions(self) -> Set[str]:
+        with self._lock:
+            return set().union(*(entry.sessions for entry in self._clients.values()))
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            entries = list(self._clients.items())
+        return [
+            {
+                "provider": provider,
+                "model": model,
+                "temperature": temperature,
+                "options": [name for name, _ in options],  # values may hold API keys
+                "sessions": len(entry.sessions),
+                **entry.stats.snapshot(),
+            }
+            for (provider, model, temperature, options), entry in entries
+        ]
+
+
+llm_registry = LLMRegistry()
+
+
+def get_llm(provider: str, session_id: Optional[str] = None, hedge: Optional[Dict] = None, **kwargs):
+    """
+    Returns the shared client for this provider/model/temperature from the
+    process-wide registry, behind the provider's rate-limit scheduler (see
+    RATE_LIMITS). Extra keyword arguments are passed to the client and become
+    part of the registry key.
+
+    With hedge={"provider": ..., "model_name": ..., "percentile": 95, ...}
+    the client is wrapped in a HedgedChatModel that re-sends slow requests to
+    that secondary provider; HEDGE_SETTINGS keys configure the hedge itself.
+    The hedged model is built over the shared clients, so its latency history
+    is process-wide, and only then rate-limited under this session.
+    """
+    options = dict(kwargs)
+    model = options.pop("model_name", None)
+    temperature = options.pop("temperature", 0)
+    llm = llm_registry.get(provider, model, temperature, session_id=session_id, **options)
+    if hedge:
+        secondary_options = {k: v for k, v in hedge.items() if k not in HEDGE_SETTINGS}
+        settings = {k: v for k, v in hedge.items() if k in HEDGE_SETTINGS}
+        secondary_provider = secondary_options.pop("provider")
+        secondary = llm_registry.get(secondary_provider, secondary_options.pop("model_name", None),
+                                     secondary_options.pop("temperature", 0), session_id=session_id,
+                                     **secondary_options)
+        secondary = llm_registry.rate_limited(secondary_provider, secondary, HEDGE_SESSION)
+        llm = llm_registry.hedged(llm, secondary, **settings)
+    return llm_registry.rate_limited(provider, llm, session_id)
+
+
+def llm_identity(llm) -> str:
+    """
+    Stable identifier of an LLM client (class, model, temperature) used in
+    cache keys, looking through rate-limiting and hedging wrappers.
+    """
+    if isinstance(llm, RateLimitedChatModel):
+        return llm_identity(llm.inner)
+    if isinstance(llm, HedgedChatModel):
+        return f"{type(llm).__name__}({llm_identity(llm.primary)}, {llm_identity(llm.secondary)})"
+    key = llm_registry.client_key(llm)
+    if key is not None:
+        # Registry clients (e.g. the fake provider) may not expose model/temperature themselves.
+        _, model, temperature, _ = key
+    else:
+        model = getattr(llm, "model", None) or getattr(llm, "model_name", None)
+        temperature = getattr(llm, "temperature", None)
+    return f"{type(llm).__name__}:{model}:{temperature}"
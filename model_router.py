@@ -0,0 +1,102 @@
+# app/model_router.py
+
+import logging
+import re
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (pattern, weight): wording that usually needs aggregation, nesting or set logic.
+COMPLEXITY_PATTERNS = [
+    (r"\b(average|avg|mean|sum|total|median)\b", 1.0),
+    (r"\b(most|least|top|bottom|highest|lowest|max(imum)?|min(imum)?|rank(ed|ing)?)\b", 1.0),
+    (r"\b(per|each|every|by (month|year|country|genre|artist|customer))\b", 1.0),
+    (r"\b(ratio|percent(age)?|share|proportion|growth|trend|compared?|versus|vs)\b", 1.5),
+    (r"\b(never|without|except|not|neither|both|only|all of)\b", 1.5),
+    (r"\b(more|less|fewer|greater|higher|lower) than\b", 1.5),
+    (r"\b(between|before|after|during|since|within)\b", 0.5),
+]
+_COMPILED = [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in COMPLEXITY_PATTERNS]
+
+
+def score_complexity(question: str, schema_tables: List[str], join_paths: str = "") -> Tuple[float, Dict]:
+    """
+    Scores how hard a question is to translate, from the tables it touches,
+    the joins needed between them, aggregation/comparison wording and length.
+    """
+    keyword_score = sum(weight for pattern, weight in _COMPILED if pattern.search(question))
+    joins = len([line for line in join_paths.splitlines() if line.strip()])
+    features = {
+        "tables": len(schema_tables),
+        "joins": joins,
+        "keywords": keyword_score,
+        "words": len(question.split()),
+    }
+    score = max(0, len(schema_tables) - 1) + 0.5 * joins + keyword_score + features["words"] / 15
+    return score, features
+
+
+class RouterStats:
+    """Per-route generation latency and how often the small model had to be escalated."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self.routed = defaultdict(int)
+        self.escalations = 0
+        self._latency: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+
+    def record_route(self, route: str) -> None:
+        with self._lock:
+            self.routed[route] += 1
+
+    def record_latency(self, route: str, ms: float) -> None:
+        with self._lock:
+            self._latency[route].append(ms)
+
+    def record_escalation(self) -> None:
+        with self._lock:
+            self.escalations += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            latency = {}
+            for route, values in self._latency.items():
+                ordered = sorted(values)
+                latency[route] = {
+                    "p50": ordered[len(ordered) // 2],
+                    "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                    "calls": len(ordered),
+                }
+            small = self.routed.get("small", 0)
+            return {
+                "routed": dict(self.routed),
+                "escalations": self.escalations,
+                "escalation_rate": self.escalations / small if small else 0.0,
+                "generate_ms": latency,
+            }
+
+
+class ModelRouter:
+    """
+    Sends simple questions to `small_llm` and complex ones (score >=
+    threshold) to `large_llm`; a small-model query that fails validation or
+    execution is regenerated by the large model.
+    """
+
+    def __init__(self, small_llm, large_llm, threshold: float = 3.0):
+        self.small_llm = small_llm
+        self.large_llm = large_llm
+        self.threshold = threshold
+        self.stats = RouterStats()
+
+    def route(self, question: str, schema_tables: List[str], join_paths: str = "") -> Tuple[str, float, Dict]:
+        score, features = score_complexity(question, schema_tables, join_paths)
+        route = "large" if score >= self.threshold else "small"
+        self.stats.record_route(route)
+        logger.info(f"Model route: {route} (complexity {score:.1f}, {features})")
+        return route, score, features
+
+    def llm_for(self, route: str):
+        return self.small_llm if route == "small" else self.large_llm
@@ -0,0 +1,133 @@
+# app/query_budget.py
+
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# SQLite calls the progress handler every this many VM instructions (well under a millisecond).
+PROGRESS_OPS = 1000
+
+
+class QueryBudgetExceeded(Exception):
+    """The query ran past its wall-clock budget and was stopped."""
+
+
+class QueryCancelled(Exception):
+    """The query was stopped through its CancelHandle."""
+
+
+def interrupt_connection(dbapi_connection) -> None:
+    """Best-effort abort of the statement running on a DBAPI connection (sqlite3 interrupt, psycopg cancel)."""
+    for name in ("interrupt", "cancel"):
+        method = getattr(dbapi_connection, name, None)
+        if callable(method):
+            try:
+                method()
+            except Exception:
+                pass
+            return
+
+
+class CancelHandle:
+    """
+    Lets another thread (e.g. a UI callback) stop the query a graph run is
+    executing. Pass it as config={"configurable": {"cancel_handle": handle}}.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._connections = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        self._event.set()
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            interrupt_connection(connection)
+        logger.info(f"Query cancelled ({len(connections)} running statements interrupted)")
+
+    def attach(self, dbapi_connection) -> None:
+        with self._lock:
+            self._connections.add(dbapi_connection)
+        if self.cancelled:
+            interrupt_connection(dbapi_connection)
+
+    def detach(self, dbapi_connection) -> None:
+        with self._lock:
+            self._connections.discard(dbapi_connection)
+
+
+class QueryBudget:
+    """
+    Wall-clock deadline and cancel flag for one query, enforced by the driver
+    where it can be: a progress handler on SQLite, SET LOCAL statement_timeout
+    on PostgreSQL, and a check between fetched batches everywhere.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, cancel: Optional[CancelHandle] = None):
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.cancel = cancel
+
+    def exceeded(self) -> Optional[Exception]:
+        if self.cancel is not None and self.cancel.cancelled:
+            return QueryCancelled("Query cancelled")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return QueryBudgetExceeded(f"Query exceeded its {self.timeout:g}s time budget")
+        return None
+
+    def check(self) -> None:
+        error = self.exceeded()
+        if error is not None:
+            raise error
+
+    def translate(self, error: Exception) -> Exception:
+        """Maps the driver's 'interrupted'/'statement timeout' error to the budget exception."""
+        if isinstance(error, (QueryBudgetExceeded, QueryCancelled)):
+            return error
+        return self.exceeded() or error
+
+    def progress(self) -> int:
+        """SQLite progress handler: a non-zero return aborts the running statement."""
+        return 1 if self.exceeded() is not None else 0
+
+    def statement_timeout_ms(self) -> int:
+        return max(1, int((self.deadline - time.monotonic()) * 1000))
+
+    def prepare(self, connection, dialect: str) -> None:
+        """Installs the budget on a SQLAlchemy Connection inside a transaction."""
+        dbapi = connection.connection.driver_connection
+        if dialect == "sqlite":
+            dbapi.set_progress_handler(self.progress, PROGRESS_OPS)
+        elif dialect == "postgresql" and self.deadline is not None:
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {self.statement_timeout_ms()}")
+        if self.cancel is not None:
+            self.cancel.attach(dbapi)
+
+    def release(self, connection, dialect: str) -> None:
+        dbapi = connection.connection.driver_connection
+        if self.cancel is not None:
+            self.cancel.detach(dbapi)
+        if dialect == "sqlite":
+            dbapi.set_progress_handler(None, 0)  # the connection goes back to the pool
+
+    async def aprepare(self, connection, dialect: str) -> None:
+        """Async counterpart of prepare for an AsyncConnection (aiosqlite/asyncpg)."""
+        if dialect == "sqlite":
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.set_progress_handler(self.progress, PROGRESS_OPS)
+        elif dialect == "postgresql" and self.deadline is not None:
+            await connection.exec_driver_sql(f"SET LOCAL statement_timeout = {self.statement_timeout_ms()}")
+
+    async def arelease(self, connection, dialect: str) -> None:
+        if dialect == "sqlite":
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.set_progress_handler(None, 0)
@@ -0,0 +1,111 @@
+# app/query_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Folds case, unicode forms, punctuation and whitespace."""
+    question = unicodedata.normalize("NFKC", question).casefold()
+    question = _PUNCT_RE.sub(" ", question)
+    return _SPACE_RE.sub(" ", question).strip()
+
+
+class QuestionCache:
+    """
+    Exact-match cache from normalized question (+ schema fingerprint and model
+    identity) to previously generated SQL, with LRU eviction, a TTL and
+    optional JSON persistence. Safe to share between sessions.
+    """
+
+    def __init__(self, path: Optional[str] = None, maxsize: int = 1000, ttl: Optional[float] = 7 * 24 * 3600):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        if path:
+            self._load()
+
+    @staticmethod
+    def key(question: str, fingerprint: str, model_id: str) -> str:
+        raw = "\x1f".join([normalize_question(question), fingerprint, model_id])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, entry: Dict, now: float) -> bool:
+        return self.ttl is not None and now - entry["created_at"] > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry, now):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["sql"]
+
+    def put(self, key: str, sql: str, question: str = "") -> None:
+        with self._lock:
+            self._entries[key] = {"sql": sql, "question": question, "created_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            if self.path:
+                self._save()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable question cache {self.path}: {e}")
+            return
+        now = time.time()
+        # Entries are stored least- to most-recently used.
+        for key, entry in entries:
+            if not self._expired(entry, now):
+                self._entries[key] = entry
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        logger.info(f"Question cache loaded: {len(self._entries)} entries from {self.path}")
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self._entries.items()), f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write question cache: {e}")
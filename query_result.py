@@ -0,0 +1,127 @@
+# app/query_result.py
+
+import copy
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_community.utilities.sql_database import truncate_word
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: columns then stay plain Python lists
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+
+def _to_arrow_column(values: List[Any]):
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        # SQLite columns may mix types; keep them readable as strings.
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+class QueryResult:
+    """
+    Typed, column-oriented query result: column names, dtypes and one buffer
+    per column (an Arrow table when pyarrow is installed). The list-of-tuples
+    string that prompts use is only built when str() is called, then cached.
+    """
+
+    def __init__(self, columns: Sequence[str], data: Sequence[List[Any]], truncated: bool = False,
+                 total_rows: Optional[int] = None, total_exact: bool = True, nbytes: int = 0,
+                 max_string_length: int = 300):
+        self.columns = list(columns)
+        self.num_rows = len(data[0]) if len(data) else 0
+        self.truncated = truncated
+        self.total_rows = self.num_rows if total_rows is None else total_rows
+        self.total_exact = total_exact
+        self.nbytes = nbytes
+        self.max_string_length = max_string_length
+        self._rows = None
+        self._text = None
+        if pa is not None:
+            # from_arrays, unlike a dict, keeps duplicate names (SELECT * over a join).
+            self._table = pa.Table.from_arrays([_to_arrow_column(list(values)) for values in data], names=self.columns)
+            self._data = None
+            self.dtypes = [str(t) for t in self._table.schema.types]
+        else:
+            self._table = None
+            self._data = [list(values) for values in data]
+            self.dtypes = [type(next((v for v in values if v is not None), None)).__name__ for values in self._data]
+
+    def shallow_copy(self) -> "QueryResult":
+        """Shares the column buffers but not the lazily built rows/string (used by the result cache)."""
+        other = copy.copy(self)
+        other._rows = other._text = None
+        return other
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def column(self, name: str) -> List[Any]:
+        index = self.columns.index(name)
+        if self._table is not None:
+            return self._table.column(index).to_pylist()
+        return self._data[index]
+
+    def rows(self) -> List[tuple]:
+        """Row tuples of Python values (built on first use)."""
+        if self._rows is None:
+            if self._table is not None:
+                columns = [column.to_pylist() for column in self._table.columns]
+            else:
+                columns = self._data
+            self._rows = list(zip(*columns)) if columns else []
+        return self._rows
+
+    def head(self, n: int) -> List[tuple]:
+        """The first n row tuples, converting only those rows."""
+        if self._rows is not None:
+            return self._rows[:n]
+        if self._table is not None:
+            columns = [column.to_pylist() for column in self._table.slice(0, n).columns]
+        else:
+            columns = [values[:n] for values in self._data]
+        return list(zip(*columns)) if columns else []
+
+    def __str__(self) -> str:
+        # Same format as SQLDatabase.run, so prompts read exactly as before.
+        if self._text is None:
+            rows = [tuple(truncate_word(v, length=self.max_string_length) for v in row) for row in self.rows()]
+            self._text = str(rows) if rows else ""
+        return self._text
+
+    def __repr__(self) -> str:
+        return f"QueryResult({self.num_rows} rows, columns={self.columns}, dtypes={self.dtypes})"
+
+    def preview(self, max_rows: int = 5) -> str:
+        """Short description for logs, without building the full string."""
+        head = self.head(max_rows)
+        more = f" ... (+{self.num_rows - max_rows} rows)" if self.num_rows > max_rows else ""
+        return f"{self.columns} {head}{more}"
+
+    def note(self) -> str:
+        """Human-readable truncation note for prompts and the UI ("" when complete)."""
+        if not self.truncated:
+            return ""
+        total = f"{self.total_rows:,}" if self.total_exact else f"at least {self.total_rows:,}"
+        return f"Showing the first {self.num_rows:,} of {total} rows."
+
+    def to_arrow(self):
+        """The Arrow table itself (no copy); st.dataframe accepts it directly."""
+        if self._table is None:
+            raise ImportError("pyarrow is required for to_arrow()")
+        return self._table
+
+    def to_dataframe(self):
+        """Arrow-backed table if available, else a pandas DataFrame built from the column lists."""
+        if self._table is not None:
+            return self._table
+        import pandas as pd
+
+        return pd.DataFrame(dict(zip(self.columns, self._data)), columns=self.columns)
+
+    def schema(self) -> Dict[str, str]:
+        return dict(zip(self.columns, self.dtypes))
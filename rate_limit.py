@@ -0,0 +1,281 @@
+# app/rate_limit.py
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream, generate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+from schema_retrieval import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tokens reserved for the completion until the provider reports real usage.
+DEFAULT_COMPLETION_TOKENS = 256
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for HTTP 429 from the OpenAI/Ollama/httpx clients."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to `capacity`; the level may go negative on reconciliation."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for one provider: a request is admitted
+    once both the requests/min and tokens/min buckets allow it. Waiting
+    requests are queued per session and sessions are served round-robin, so
+    one analyst's batch can't starve everyone else. A 429 pauses admissions
+    for a jittered exponential backoff (or the provider's Retry-After).
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: Optional[float] = None,
+                 max_retries: int = 5, base_backoff: float = 1.0, max_backoff: float = 30.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._cond = threading.Condition()
+        self._queues: "OrderedDict[str, Deque[object]]" = OrderedDict()
+        # Async waiters, woken from any thread through their event loop.
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._paused_until = 0.0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.wait_seconds = 0.0
+        self.tokens_used = 0
+
+    def _head(self) -> Optional[object]:
+        for tickets in self._queues.values():
+            if tickets:
+                return tickets[0]
+        return None
+
+    def _notify(self) -> None:
+        self._cond.notify_all()
+        for loop, event in self._waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _admit(self, session: str, ticket: object, tokens: int, start: float) -> Optional[float]:
+        """
+        Admits ticket if it is next and within budget (returns 0), otherwise
+        returns how long to wait (None: until notified). Caller holds the lock.
+        """
+        if self._head() is not ticket:
+            return None
+        now = time.monotonic()
+        wait = max(self._paused_until - now, self.requests.wait_time(1, now),
+                   self.tokens.wait_time(tokens, now) if self.tokens else 0.0)
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+        tickets = self._queues.pop(session)
+        tickets.popleft()
+        if tickets:
+            self._queues[session] = tickets  # back of the round-robin order
+        self.admitted += 1
+        self.tokens_used += tokens
+        self.wait_seconds += now - start
+        self._notify()
+        return 0.0
+
+    def _withdraw(self, session: str, ticket: object) -> None:
+        """Drops a ticket whose caller gave up waiting, so it is never admitted. Caller holds the lock."""
+        tickets = self._queues.get(session)
+        if tickets is None or ticket not in tickets:
+            return
+        tickets.remove(ticket)
+        if not tickets:
+            del self._queues[session]
+        self._notify()
+
+    def acquire(self, session: str, tokens: int) -> None:
+        """Blocks until this session's request is next in the fair order and within budget."""
+        ticket = object()
+        start = time.monotonic()
+        with self._cond:
+            self._queues.setdefault(session, deque()).append(ticket)
+            try:
+                while True:
+                    wait = self._admit(session, ticket, tokens, start)
+                    if wait == 0:
+                        return
+                    self._cond.wait(wait)
+            except BaseException:
+                self._withdraw(session, ticket)
+                raise
+
+    async def aacquire(self, session: str, tokens: int) -> None:
+        """acquire() waiting on the event loop instead of a thread; a cancelled call gives up its place."""
+        ticket = object()
+        start = time.monotonic()
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self._queues.setdefault(session, deque()).append(ticket)
+            self._waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    waiter[1].clear()
+                    wait = self._admit(session, ticket, tokens, start)
+                if wait == 0:
+                    return
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._cond:
+                self._withdraw(session, ticket)
+            raise
+        finally:
+            with self._cond:
+                self._waiters.discard(waiter)
+
+    def settle(self, reserved: int, used: Optional[int]) -> None:
+        """Charges (or refunds) the difference between reserved and reported tokens."""
+        if used is None or not self.tokens:
+            return
+        with self._cond:
+            self.tokens.take(used - reserved)
+            self.tokens_used += used - reserved
+            self._notify()
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Pauses all admissions after a 429 and returns the delay."""
+        delay = retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        with self._cond:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._notify()
+        logger.warning(f"LLM provider rate limited (attempt {attempt + 1}); backing off {delay:.1f}s")
+        return delay
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "admitted": self.admitted,
+                "queued": sum(len(t) for t in self._queues.values()),
+                "sessions_waiting": sum(1 for t in self._queues.values() if t),
+                "rate_limited": self.rate_limited,
+                "tokens_used": self.tokens_used,
+                "avg_wait_ms": 1000 * self.wait_seconds / self.admitted if self.admitted else 0.0,
+            }
+
+
+def _usage(chunks: List[ChatGenerationChunk]) -> Optional[int]:
+    for chunk in reversed(chunks):
+        usage = getattr(chunk.message, "usage_metadata", None)
+        if usage:
+            return usage.get("total_tokens")
+    return None
+
+
+class RateLimitedChatModel(BaseChatModel):
+    """
+    Chat model that admits each call of `inner` through an LLMScheduler
+    under `session`, retrying 429s that arrive before the first token.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: Any
+    scheduler: Any
+    session: str = "default"
+    completion_tokens: int = DEFAULT_COMPLETION_TOKENS
+
+    @property
+    def _llm_type(self) -> str:
+        return "rate-limited"
+
+    def _reserve(self, messages: List[BaseMessage]) -> int:
+        return sum(estimate_tokens(str(m.content)) for m in messages) + self.completion_tokens
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        reserved = self._reserve(messages)
+        for attempt in range(self.scheduler.max_retries + 1):
+            self.scheduler.acquire(self.session, reserved)
+            chunks: List[ChatGenerationChunk] = []
+            try:
+                for message in self.inner.stream(messages, stop=stop, **kwargs):
+                    chunk = ChatGenerationChunk(message=message)
+                    chunks.append(chunk)
+                    yield chunk
+            except Exception as e:
+                if chunks or not is_rate_limit_error(e) or attempt == self.scheduler.max_retries:
+                    raise
+                time.sleep(self.scheduler.backoff(attempt, e))
+                continue
+            self.scheduler.settle(reserved, _usage(chunks))
+            return
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        reserved = self._reserve(messages)
+        for attempt in range(self.scheduler.max_retries + 1):
+            await self.scheduler.aacquire(self.session, reserved)
+            chunks: List[ChatGenerationChunk] = []
+            try:
+                async for message in self.inner.astream(messages, stop=stop, **kwargs):
+                    chunk = ChatGenerationChunk(message=message)
+                    chunks.append(chunk)
+                    yield chunk
+            except Exception as e:
+                if chunks or not is_rate_limit_error(e) or attempt == self.scheduler.max_retries:
+                    raise
+                await asyncio.sleep(self.scheduler.backoff(attempt, e))
+                continue
+            self.scheduler.settle(reserved, _usage(chunks))
+            return
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop=stop, **kwargs))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                         **kwargs: Any) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, **kwargs))
@@ -0,0 +1,208 @@
+# app/result_cache.py
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from langchain_community.utilities.sql_database import SQLDatabase
+from sqlalchemy import text
+
+from query_result import QueryResult
+from result_stream import ResultLimits
+from schema_cache import sqlite_file_path
+from sql_validation import SQLGLOT_DIALECTS
+
+try:
+    import sqlglot
+    from sqlglot.errors import SqlglotError
+except ImportError:  # optional: SQL is then only whitespace-normalized
+    sqlglot = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Results of these depend on when/how often the query runs, not only on the data.
+_VOLATILE_RE = re.compile(r"\b(random|randomblob|uuid|gen_random_uuid|now|current_(date|time|timestamp)|"
+                          r"localtime(stamp)?|sysdate|getdate|clock_timestamp)\b", re.IGNORECASE)
+_QUOTED_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+_SPACE_RE = re.compile(r"\s+")
+
+_sqlite_versions: Dict[str, "_SQLiteDataVersion"] = {}
+_sqlite_versions_lock = threading.Lock()
+
+
+def canonicalize_sql(sql: str, dialect: str) -> str:
+    """
+    Canonical text for a query: re-rendered by sqlglot when installed (keyword
+    case, whitespace, redundant parentheses), otherwise whitespace outside
+    string literals collapsed and the trailing semicolon dropped.
+    """
+    sql = sql.strip().rstrip(";").strip()
+    if sqlglot is not None:
+        try:
+            tree = sqlglot.parse_one(sql, read=SQLGLOT_DIALECTS.get(dialect))
+            if tree is not None:
+                return tree.sql(dialect=SQLGLOT_DIALECTS.get(dialect))
+        except SqlglotError:
+            pass
+    parts = _QUOTED_RE.split(sql)
+    return "".join(part if i % 2 else _SPACE_RE.sub(" ", part) for i, part in enumerate(parts))
+
+
+def is_volatile(sql: str) -> bool:
+    """True for queries whose result changes without the data changing (random(), date('now'), ...)."""
+    return bool(_VOLATILE_RE.search(_QUOTED_RE.sub("''", sql))) or "'now'" in sql.lower()
+
+
+class _SQLiteDataVersion:
+    """
+    PRAGMA data_version on a dedicated read-only connection changes whenever
+    any other connection commits; file size/mtime (and the WAL's) cover
+    writers the pragma can't see, such as a replaced database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    def _stat(self, path: str) -> str:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return "-"
+        return f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+    def token(self) -> str:
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        return f"{version}|{self._stat(self.path)}|{self._stat(self.path + '-wal')}"
+
+
+def data_version(db: SQLDatabase) -> Optional[str]:
+    """
+    Returns a token that changes whenever committed data changes, or None
+    when the dialect offers no cheap way to tell (results aren't cached then).
+    """
+    if db.dialect == "sqlite":
+        path = sqlite_file_path(db)
+        if path is None:
+            return None
+        with _sqlite_versions_lock:
+            tracker = _sqlite_versions.get(path)
+            if tracker is None:
+                tracker = _sqlite_versions[path] = _SQLiteDataVersion(path)
+        return tracker.token()
+    if db.dialect == "postgresql":
+        # The WAL position moves on every committed write (replay position on replicas).
+        with db._engine.connect() as conn:
+            return str(conn.execute(text(
+                "SELECT CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() "
+                "ELSE pg_current_wal_insert_lsn() END"
+            )).scalar())
+    return None
+
+
+class ResultCache:
+    """
+    LRU cache of query results keyed by canonical SQL, result limits and the
+    database's data version, bounded by the total size of the cached results.
+    Entries of an older data version are dropped as soon as a newer one is
+    seen, so changed data is never served. Safe to share between sessions.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl: Optional[float] = None,
+                 version_fn: Callable[[SQLDatabase], Optional[str]] = data_version):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version_fn = version_fn
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[QueryResult, str, str, float]]" = OrderedDict()
+        self._versions: Dict[str, str] = {}
+
+    def key(self, db: SQLDatabase, sql: str, limits: ResultLimits = ResultLimits()) -> Optional[str]:
+        """Cache key for sql on db at its current data version; None if it shouldn't be cached."""
+        if is_volatile(sql):
+            return None
+        try:
+            version = self.version_fn(db)
+        except Exception as e:
+            logger.warning(f"Could not read data version; not caching: {e}")
+            return None
+        if version is None:
+            return None
+        source = db._engine.url.render_as_string(hide_password=True)
+        self._observe(source, version)
+        raw = "\x1f".join([source, version, repr(tuple(limits)), canonicalize_sql(sql, db.dialect)])
+        return f"{source}\x1f{version}\x1f" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _observe(self, source: str, version: str) -> None:
+        with self._lock:
+            previous = self._versions.get(source)
+            self._versions[source] = version
+            if previous is None or previous == version:
+                return
+            stale = [k for k, (_, s, v, _) in self._entries.items() if s == source and v != version]
+            for k in stale:
+                self._drop(k)
+            self.invalidations += len(stale)
+        if stale:
+            logger.info(f"Data changed; dropped {len(stale)} cached results")
+
+    def _drop(self, key: str) -> None:
+        result, _, _, _ = self._entries.pop(key)
+        self.bytes -= result.nbytes
+
+    def get(self, key: Optional[str]) -> Optional[QueryResult]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[3] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0].shallow_copy()
+
+    def put(self, key: Optional[str], result: QueryResult) -> None:
+        if key is None or result.nbytes > self.max_bytes:
+            return
+        source, version, _ = key.split("\x1f")
+        with self._lock:
+            if self._versions.get(source) != version:
+                return  # the data changed while the query ran
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (result.shallow_copy(), source, version, time.time())
+            self.bytes += result.nbytes
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
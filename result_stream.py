@@ -0,0 +1,175 @@
+# app/result_stream.py
+
+import logging
+from typing import List, NamedTuple, Optional, Sequence
+
+from langchain_community.utilities.sql_database import SQLDatabase
+from sqlalchemy import text
+from sqlalchemy.exc import ResourceClosedError
+
+from query_budget import CancelHandle, QueryBudget
+from query_result import QueryResult
+
+logger = logging.getLogger(__name__)
+
+
+class ResultLimits(NamedTuple):
+    max_rows: int = 1000
+    max_bytes: int = 1_000_000
+    fetch_size: int = 500
+    # Rows past the budget are still counted (not kept) up to this many.
+    count_limit: Optional[int] = 100_000
+    # Wall-clock budget in seconds (None: unlimited).
+    timeout: Optional[float] = 30.0
+
+
+class NoRowsReturned(Exception):
+    """The statement returned no result set (DDL/DML); its transaction was rolled back."""
+
+
+class RowCollector:
+    """
+    Appends fetchmany() batches to per-column buffers until the row or byte
+    budget is hit, then only counts the remaining rows.
+    """
+
+    def __init__(self, limits: ResultLimits, columns: Sequence[str] = (), max_string_length: int = 300):
+        self.limits = limits
+        self.column_names = list(columns)
+        self.max_string_length = max_string_length
+        self.data: List[list] = [[] for _ in self.column_names]
+        self.kept = 0
+        self.nbytes = 0
+        self.total_rows = 0
+        self.truncated = False
+        self.total_exact = True
+
+    def add(self, batch) -> bool:
+        """Consumes one batch; returns False once nothing more needs fetching."""
+        limits = self.limits
+        for row in batch:
+            self.total_rows += 1
+            if self.truncated:
+                continue
+            size = len(repr(tuple(row))) + 2
+            if self.kept >= limits.max_rows or self.nbytes + size > limits.max_bytes:
+                self.truncated = True
+                continue
+            for buffer, value in zip(self.data, row):
+                buffer.append(value)
+            self.kept += 1
+            self.nbytes += size
+        if self.truncated and limits.count_limit is not None and self.total_rows >= limits.count_limit:
+            self.total_exact = False
+            return False
+        return True
+
+    def finish(self) -> QueryResult:
+        result = QueryResult(self.column_names, self.data, self.truncated, self.total_rows, self.total_exact,
+                             self.nbytes, self.max_string_length)
+        if result.truncated:
+            logger.info(f"Result truncated: {result.note()} ({result.nbytes:,} bytes kept)")
+        return result
+
+
+def _read_only(connection, dialect: str) -> Optional[str]:
+    """
+    Makes the database itself reject writes for this query; returns the
+    statement that restores the connection afterwards, if one is needed.
+    """
+    if dialect == "postgresql":
+        connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+    elif dialect == "sqlite" and not connection.exec_driver_sql("PRAGMA query_only").scalar():
+        connection.exec_driver_sql("PRAGMA query_only = ON")
+        return "PRAGMA query_only = OFF"
+    return None
+
+
+async def _aread_only(connection, dialect: str) -> Optional[str]:
+    if dialect == "postgresql":
+        await connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+    elif dialect == "sqlite" and not (await connection.exec_driver_sql("PRAGMA query_only")).scalar():
+        await connection.exec_driver_sql("PRAGMA query_only = ON")
+        return "PRAGMA query_only = OFF"
+    return None
+
+
+def stream_query(db: SQLDatabase, query: str, limits: ResultLimits = ResultLimits(),
+                 cancel: Optional[CancelHandle] = None) -> QueryResult:
+    """
+    Runs query on a streaming cursor and fetches it in fetch_size batches,
+    so only the rows within the budget are ever held in memory. The query
+    runs read-only; raises on database errors (including attempted writes),
+    NoRowsReturned when it isn't a query, QueryBudgetExceeded past
+    limits.timeout and QueryCancelled when cancel is triggered.
+    """
+    budget = QueryBudget(limits.timeout, cancel)
+    budget.check()
+    with db._engine.begin() as connection:
+        restore = _read_only(connection, db.dialect)
+        if db._schema is not None and db.dialect == "postgresql":
+            connection.exec_driver_sql(f"SET search_path TO {db._schema}")
+        budget.prepare(connection, db.dialect)
+        try:
+            connection = connection.execution_options(stream_results=True, max_row_buffer=limits.fetch_size)
+            cursor = connection.execute(text(query))
+            if not cursor.returns_rows:
+                raise NoRowsReturned("Only statements that return rows can be run")
+            collector = RowCollector(limits, list(cursor.keys()), db._max_string_length)
+            try:
+                while True:
+                    batch = cursor.fetchmany(limits.fetch_size)
+                    if not batch or not collector.add(batch):
+                        break
+                    budget.check()
+            finally:
+                cursor.close()
+        except Exception as e:
+            error = budget.translate(e)
+            if error is e:
+                raise
+            raise error from e
+        finally:
+            budget.release(connection, db.dialect)
+            if restore:
+                connection.exec_driver_sql(restore)
+    return collector.finish()
+
+
+async def astream_query(engine, query: str, limits: ResultLimits = ResultLimits(), schema: Optional[str] = None,
+                        max_string_length: int = 300, cancel: Optional[CancelHandle] = None) -> QueryResult:
+    """Async counterpart of stream_query over an AsyncEngine (AsyncConnection.stream)."""
+    budget = QueryBudget(limits.timeout, cancel)
+    budget.check()
+    dialect = engine.dialect.name
+    async with engine.begin() as connection:
+        restore = await _aread_only(connection, dialect)
+        if schema is not None and dialect == "postgresql":
+            await connection.exec_driver_sql(f"SET search_path TO {schema}")
+        await budget.aprepare(connection, dialect)
+        try:
+            connection = await connection.execution_options(max_row_buffer=limits.fetch_size)
+            cursor = await connection.stream(text(query))
+            try:
+                columns = list(cursor.keys())
+            except ResourceClosedError:
+                raise NoRowsReturned("Only statements that return rows can be run") from None
+            collector = RowCollector(limits, columns, max_string_length)
+            try:
+                while True:
+                    batch = await cursor.fetchmany(limits.fetch_size)
+                    if not batch or not collector.add(batch):
+                        break
+                    budget.check()
+            finally:
+                await cursor.close()
+        except Exception as e:
+            error = budget.translate(e)
+            if error is e:
+                raise
+            raise error from e
+        finally:
+            await budget.arelease(connection, dialect)
+            if restore:
+                await connection.exec_driver_sql(restore)
+    return collector.finish()
@@ -0,0 +1,221 @@
+# app/schema_cache.py
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from sqlalchemy import Column, MetaData, Table, text
+from sqlalchemy.types import NullType
+from langchain_community.utilities.sql_database import SQLDatabase
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".schema_cache"
+DEFAULT_SCHEMA_WORKERS = 8
+
+
+def sqlite_file_path(db: SQLDatabase) -> Optional[str]:
+    """Returns the absolute path of a file-backed SQLite database, else None."""
+    if db.dialect != "sqlite":
+        return None
+    database = db._engine.url.database
+    if not database or database == ":memory:" or database.startswith("file::memory:"):
+        return None
+    return os.path.abspath(database)
+
+
+def database_fingerprint(db: SQLDatabase) -> str:
+    """
+    Returns a cheap fingerprint that changes whenever the schema changes.
+    SQLite uses PRAGMA schema_version plus file identity; other dialects
+    hash the column catalog from information_schema.
+    """
+    parts = [
+        db.dialect,
+        db._engine.url.render_as_string(hide_password=True),
+        ",".join(db.get_usable_table_names()),
+        str(db._sample_rows_in_table_info),
+    ]
+    with db._engine.connect() as conn:
+        if db.dialect == "sqlite":
+            parts.append(str(conn.execute(text("PRAGMA schema_version")).scalar()))
+            db_file = sqlite_file_path(db)
+            if db_file:
+                st = os.stat(db_file)
+                parts.append(f"{db_file}:{st.st_dev}:{st.st_ino}")
+        else:
+            try:
+                rows = conn.execute(text(
+                    "SELECT table_schema, table_name, column_name, data_type, ordinal_position "
+                    "FROM information_schema.columns "
+                    "ORDER BY table_schema, table_name, ordinal_position"
+                )).fetchall()
+                parts.append(hashlib.sha256(repr(rows).encode("utf-8")).hexdigest())
+            except Exception as e:
+                # Without a catalog to hash we can only key on the table list.
+                logger.warning(f"Could not read information_schema for fingerprint: {e}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _reflect_table(db: SQLDatabase, metadata: MetaData, table_name: str) -> None:
+    """
+    Reflects only table_name. Tables its foreign keys point at get a name-only
+    stub instead of being reflected (and their own FKs in turn), which is all
+    CREATE TABLE rendering needs.
+    """
+    # Table(autoload_with=...) rather than MetaData.reflect(), which lists every table and view first.
+    Table(table_name, metadata, autoload_with=db._engine, schema=db._schema, resolve_fks=False)
+    for table in list(metadata.tables.values()):
+        for fk in table.foreign_keys:
+            table_key, column = fk.target_fullname.rsplit(".", 1)
+            schema, _, name = table_key.rpartition(".")
+            referred = metadata.tables.get(table_key)
+            if referred is None:
+                referred = Table(name, metadata, schema=schema or None)
+            if column not in referred.c:
+                referred.append_column(Column(column, NullType()))
+
+
+def describe_table_detached(db: SQLDatabase, table_name: str) -> str:
+    """
+    Renders one table through a shallow copy of db with its own MetaData, so
+    the reflection is not retained on db and concurrent calls don't share state.
+    """
+    detached = copy.copy(db)
+    detached._metadata = MetaData()
+    _reflect_table(db, detached._metadata, table_name)
+    return detached.get_table_info([table_name])
+
+
+def describe_tables(db: SQLDatabase, table_names: List[str],
+                    max_workers: int = DEFAULT_SCHEMA_WORKERS) -> Dict[str, str]:
+    """
+    Renders DDL and sample rows for each table, keyed by table name. Tables are
+    reflected on a bounded thread pool, each worker checking out its own
+    connection from the engine pool; the output is identical to a serial run.
+    """
+    table_names = list(table_names)
+    if max_workers <= 1 or len(table_names) <= 1:
+        return {name: describe_table_detached(db, name) for name in table_names}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="schema") as pool:
+        descriptions = pool.map(lambda name: describe_table_detached(db, name), table_names)
+        return dict(zip(table_names, descriptions))
+
+
+class LazyTableDescriptions(Mapping):
+    """
+    Read-only mapping of table name -> description that fetches each table on
+    first use and keeps at most maxsize descriptions in an LRU.
+    """
+
+    def __init__(self, db: SQLDatabase, table_names: Iterable[str], maxsize: int = 256,
+                 _cache: Optional[OrderedDict] = None, _lock: Optional[threading.Lock] = None):
+        self.db = db
+        self.maxsize = maxsize
+        self._names = frozenset(table_names)
+        self._cache = _cache if _cache is not None else OrderedDict()
+        self._lock = _lock or threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getitem__(self, name: str) -> str:
+        if name not in self._names:
+            raise KeyError(name)
+        with self._lock:
+            if name in self._cache:
+                self._cache.move_to_end(name)
+                self.hits += 1
+                return self._cache[name]
+        description = describe_table_detached(self.db, name)
+        with self._lock:
+            self.misses += 1
+            self._cache[name] = description
+            self._cache.move_to_end(name)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return description
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
+
+    def __iter__(self):
+        return iter(sorted(self._names))
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def invalidate(self, table_names: Iterable[str]) -> None:
+        with self._lock:
+            for name in table_names:
+                self._cache.pop(name, None)
+
+    def with_names(self, table_names: Iterable[str]) -> "LazyTableDescriptions":
+        """Returns a view over a new table list that shares this LRU."""
+        return LazyTableDescriptions(self.db, table_names, self.maxsize, self._cache, self._lock)
+
+
+def render_schema(tables: Dict[str, str]) -> str:
+    """Joins per-table descriptions exactly like SQLDatabase.get_table_info does."""
+    return "\n\n".join(sorted(tables.values()))
+
+
+def _cache_path(cache_dir: str, fingerprint: str) -> str:
+    return os.path.join(cache_dir, f"{fingerprint}.json")
+
+
+def load_cached_schema(cache_dir: str, fingerprint: str) -> Optional[Dict[str, str]]:
+    """Returns cached per-table descriptions for the fingerprint, or None on a miss."""
+    path = _cache_path(cache_dir, fingerprint)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable schema cache {path}: {e}")
+        return None
+    if payload.get("fingerprint") != fingerprint:
+        return None
+    return payload["tables"]
+
+
+def save_cached_schema(cache_dir: str, fingerprint: str, tables: Dict[str, str]) -> None:
+    """Writes per-table descriptions atomically so readers never see a partial file."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(cache_dir, fingerprint)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "created_at": time.time(), "tables": tables}, f)
+    os.replace(tmp_path, path)
+
+
+def load_schema_description(db: SQLDatabase, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                            max_workers: int = DEFAULT_SCHEMA_WORKERS):
+    """
+    Returns (fingerprint, per-table descriptions), reflecting the database only
+    when no cache entry matches the current fingerprint. Pass cache_dir=None to
+    always reflect.
+    """
+    start = time.perf_counter()
+    fingerprint = database_fingerprint(db)
+    if cache_dir:
+        tables = load_cached_schema(cache_dir, fingerprint)
+        if tables is not None:
+            logger.info(f"Schema cache hit ({len(tables)} tables) in {(time.perf_counter() - start) * 1000:.1f} ms")
+            return fingerprint, tables
+
+    tables = describe_tables(db, db.get_usable_table_names(), max_workers)
+    if cache_dir:
+        try:
+            save_cached_schema(cache_dir, fingerprint, tables)
+        except OSError as e:
+            logger.warning(f"Could not write schema cache: {e}")
+    logger.info(f"Schema reflected ({len(tables)} tables) in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return fingerprint, tables
@@ -0,0 +1,169 @@
+# app/schema_refresh.py
+
+import hashlib
+import logging
+import threading
+from typing import Dict, Mapping, NamedTuple, Optional
+
+from sqlalchemy import inspect, text
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from schema_cache import LazyTableDescriptions, database_fingerprint, describe_tables, save_cached_schema
+from schema_retrieval import LazySchemaIndex, SchemaIndex
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaSnapshot(NamedTuple):
+    fingerprint: str
+    tables: Mapping[str, str]
+    index: SchemaIndex
+
+
+def _build_index(tables: Mapping[str, str]) -> SchemaIndex:
+    if isinstance(tables, LazyTableDescriptions):
+        return LazySchemaIndex(tables)
+    return SchemaIndex(tables)
+
+
+class SchemaCatalog:
+    """
+    Holds the current schema snapshot. Readers take one snapshot per request,
+    so a refresh swapping in a new snapshot never affects in-flight questions.
+    """
+
+    def __init__(self, fingerprint: str, tables: Mapping[str, str]):
+        self._lock = threading.Lock()
+        self._snapshot = SchemaSnapshot(fingerprint, tables, _build_index(tables))
+
+    def snapshot(self) -> SchemaSnapshot:
+        return self._snapshot
+
+    def swap(self, fingerprint: str, tables: Mapping[str, str]) -> SchemaSnapshot:
+        snapshot = SchemaSnapshot(fingerprint, tables, _build_index(tables))
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+
+def _hash(value) -> str:
+    return hashlib.sha256(repr(value).encode("utf-8")).hexdigest()
+
+
+def change_signal(db: SQLDatabase) -> str:
+    """
+    Returns a value that changes whenever any DDL runs. SQLite's schema_version
+    is a single cheap read; other dialects fall back to per-table signatures.
+    """
+    if db.dialect == "sqlite":
+        with db._engine.connect() as conn:
+            return str(conn.execute(text("PRAGMA schema_version")).scalar())
+    return _hash(sorted(table_signatures(db).items()))
+
+
+def table_signatures(db: SQLDatabase) -> Dict[str, str]:
+    """Returns a DDL signature per table without reflecting any table."""
+    with db._engine.connect() as conn:
+        if db.dialect == "sqlite":
+            rows = conn.execute(text(
+                "SELECT name, sql FROM sqlite_master "
+                "WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'"
+            )).fetchall()
+            return {name: _hash(sql) for name, sql in rows}
+
+        schema_filter = "WHERE table_schema = :schema " if db._schema else ""
+        params = {"schema": db._schema} if db._schema else {}
+        signatures: Dict[str, list] = {}
+        rows = conn.execute(text(
+            "SELECT table_name, column_name, data_type, ordinal_position "
+            f"FROM information_schema.columns {schema_filter}"
+            "ORDER BY table_name, ordinal_position"
+        ), params).fetchall()
+        for table_name, *column in rows:
+            signatures.setdefault(table_name, []).append(tuple(column))
+        try:
+            # MySQL exposes update/create times, Snowflake exposes last_altered.
+            column = "last_altered" if db.dialect == "snowflake" else "create_time"
+            for table_name, altered in conn.execute(text(
+                f"SELECT table_name, {column} FROM information_schema.tables {schema_filter}"
+            ), params).fetchall():
+                signatures.setdefault(table_name, []).append(("altered", str(altered)))
+        except Exception:
+            conn.rollback()
+        return {name: _hash(sig) for name, sig in signatures.items()}
+
+
+def _reload_table_list(db: SQLDatabase) -> None:
+    """Re-reads the table list SQLDatabase captured at construction time."""
+    inspector = inspect(db._engine)
+    names = set(inspector.get_table_names(schema=db._schema))
+    if db._view_support:
+        names.update(inspector.get_view_names(schema=db._schema))
+    if db._include_tables:
+        names &= db._include_tables
+    db._all_tables = names - db._ignore_tables
+
+
+class SchemaRefresher(threading.Thread):
+    """
+    Background thread that polls change_signal() and re-describes only the
+    tables whose DDL signature changed, then swaps the catalog snapshot.
+    """
+
+    def __init__(self, db: SQLDatabase, catalog: SchemaCatalog, poll_interval: float = 30.0,
+                 cache_dir: Optional[str] = None):
+        super().__init__(name="schema-refresher", daemon=True)
+        self.db = db
+        self.catalog = catalog
+        self.poll_interval = poll_interval
+        self.cache_dir = cache_dir
+        self._stop_event = threading.Event()
+        self._signal = change_signal(db)
+        usable = set(db.get_usable_table_names())
+        self._signatures = {t: s for t, s in table_signatures(db).items() if t in usable}
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Schema refresh failed: {e}")
+
+    def refresh(self) -> bool:
+        """Checks for DDL changes once; returns True if a new snapshot was swapped in."""
+        signal = change_signal(self.db)
+        if signal == self._signal:
+            return False
+
+        _reload_table_list(self.db)
+        usable = set(self.db.get_usable_table_names())
+        signatures = {t: s for t, s in table_signatures(self.db).items() if t in usable}
+        changed = sorted(t for t, s in signatures.items() if self._signatures.get(t) != s)
+        removed = set(self._signatures).difference(signatures)
+
+        # Drop stale reflections so get_table_info re-reads the changed tables.
+        for name in changed:
+            table = next((t for t in self.db._metadata.sorted_tables if t.name == name), None)
+            if table is not None:
+                self.db._metadata.remove(table)
+
+        current = self.catalog.snapshot().tables
+        fingerprint = database_fingerprint(self.db)
+        if isinstance(current, LazyTableDescriptions):
+            # Lazy mode: forget the stale descriptions, they reload on next use.
+            current.invalidate(changed + sorted(removed))
+            self.catalog.swap(fingerprint, current.with_names(signatures))
+        else:
+            tables = {t: d for t, d in current.items() if t not in removed}
+            tables.update(describe_tables(self.db, changed))
+            self.catalog.swap(fingerprint, tables)
+            if self.cache_dir:
+                save_cached_schema(self.cache_dir, fingerprint, tables)
+
+        self._signal = signal
+        self._signatures = signatures
+        logger.info(f"Schema refreshed: {len(changed)} changed {changed}, {len(removed)} removed {sorted(removed)}")
+        return True
@@ -0,0 +1,255 @@
+# app/schema_retrieval.py
+
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from join_paths import JoinEdge, JoinGraph
+
+_CREATE_RE = re.compile(r'CREATE TABLE\s+(?:"[^"]+"\.)?"?([^"\s(]+)"?\s*\((.*?)\n\)', re.S)
+_FK_RE = re.compile(r'FOREIGN KEY\s*\(([^)]*)\)\s*REFERENCES\s+"?([^"\s(]+)"?\s*\(([^)]*)\)', re.I)
+_COLUMN_RE = re.compile(r'^\s*"?([^"\s]+)"?\s+\S')
+_CONSTRAINT_PREFIXES = ("PRIMARY KEY", "FOREIGN KEY", "UNIQUE", "CHECK", "CONSTRAINT")
+_WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "and", "or", "with", "is", "are",
+    "was", "were", "be", "what", "which", "who", "how", "many", "much", "me", "show", "list",
+    "give", "find", "get", "all", "each", "per", "their", "there", "that", "this", "do", "does",
+    "top", "most", "has", "have", "id",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for prompt budgeting."""
+    return max(1, len(text) // 4)
+
+
+def _split_idents(idents: str) -> List[str]:
+    return [name.strip().strip('"') for name in idents.split(",")]
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits text and CamelCase/snake_case identifiers into lowercase, singularized terms."""
+    terms = []
+    for word in _WORD_RE.findall(text):
+        word = word.lower()
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+@dataclass
+class TableInfo:
+    name: str
+    description: str
+    columns: List[str] = field(default_factory=list)
+    # (local columns, referenced table, referenced columns)
+    foreign_keys: List[Tuple[List[str], str, List[str]]] = field(default_factory=list)
+
+
+def parse_table_description(name: str, description: str) -> TableInfo:
+    """Extracts column names and foreign keys from a CREATE TABLE description."""
+    info = TableInfo(name=name, description=description)
+    match = _CREATE_RE.search(description)
+    if not match:
+        return info
+    for line in match.group(2).split("\n"):
+        line = line.strip().rstrip(",").strip()
+        if not line:
+            continue
+        if line.upper().startswith(_CONSTRAINT_PREFIXES):
+            fk = _FK_RE.search(line)
+            if fk:
+                info.foreign_keys.append(
+                    (_split_idents(fk.group(1)), fk.group(2), _split_idents(fk.group(3)))
+                )
+            continue
+        col = _COLUMN_RE.match(line)
+        if col:
+            info.columns.append(col.group(1))
+    return info
+
+
+class SchemaIndex:
+    """
+    Lexical index over table names, column names and FK relationships, built
+    once per schema and used to select the tables relevant to a question.
+    """
+
+    TABLE_WEIGHT = 3.0
+    COLUMN_WEIGHT = 1.0
+
+    def __init__(self, tables: Dict[str, str]):
+        self.tables: Dict[str, TableInfo] = {
+            name: parse_table_description(name, desc) for name, desc in tables.items()
+        }
+        self.table_names = sorted(self.tables)
+        self.neighbours: Dict[str, set] = defaultdict(set)
+        for info in self.tables.values():
+            for _, ref_table, _ in info.foreign_keys:
+                if ref_table in self.tables and ref_table != info.name:
+                    self.neighbours[info.name].add(ref_table)
+                    self.neighbours[ref_table].add(info.name)
+        self.join_graph = JoinGraph(self.tables)
+        self._build_terms(self.tables.values())
+        self._tokens = {name: estimate_tokens(info.description) for name, info in self.tables.items()}
+
+    def _build_terms(self, infos) -> None:
+        self._term_weights: Dict[str, Dict[str, float]] = {}
+        doc_freq: Dict[str, int] = defaultdict(int)
+        for info in infos:
+            weights: Dict[str, float] = defaultdict(float)
+            for term in tokenize(info.name):
+                weights[term] = max(weights[term], self.TABLE_WEIGHT)
+            for column in info.columns:
+                for term in tokenize(column):
+                    weights[term] = max(weights[term], self.COLUMN_WEIGHT)
+            self._term_weights[info.name] = dict(weights)
+            for term in weights:
+                doc_freq[term] += 1
+        n = max(1, len(self._term_weights))
+        self._idf = {term: math.log(1 + n / df) for term, df in doc_freq.items()}
+
+    @property
+    def full_tokens(self) -> Optional[int]:
+        """Estimated tokens of the whole schema, or None when not known up front."""
+        return sum(self._tokens.values())
+
+    def _cost(self, name: str) -> int:
+        return self._tokens[name]
+
+    def _neighbours_of(self, name: str) -> List[str]:
+        return list(self.neighbours.get(name, ()))
+
+    def _fallback(self, top_k: int) -> List[str]:
+        return list(self.table_names)
+
+    def _connect(self, tables: List[str]) -> List[str]:
+        return self.join_graph.connect(tables)[0]
+
+    def join_edges(self, table_names: List[str]) -> List[JoinEdge]:
+        """FK join edges linking the given tables (plus any bridges on the way)."""
+        return self.join_graph.connect(table_names)[1]
+
+    def score(self, question: str) -> Dict[str, float]:
+        """Returns a relevance score per table for the question (0 for no overlap)."""
+        terms = set(tokenize(question))
+        return {
+            name: sum(w * self._idf[t] for t, w in weights.items() if t in terms)
+            for name, weights in self._term_weights.items()
+        }
+
+    def _match(self, scores: Dict[str, float], top_k: int, min_relative_score: float,
+               required: Optional[List[str]]) -> Tuple[List[str], float]:
+        best = max(scores.values(), default=0)
+        if best > 0:
+            ranked = sorted((n for n, s in scores.items() if s >= best * min_relative_score),
+                            key=lambda n: (-scores[n], n))
+            top = ranked[:top_k]
+        else:
+            top = self._fallback(top_k)
+        if required:
+            known = set(self.table_names)
+            required = [t for t in required if t in known]
+            top = required + [t for t in top if t not in required]
+            best = best or 1
+        return top, best
+
+    def matched(self, question: str, top_k: int = 5, min_relative_score: float = 0.5,
+                required: Optional[List[str]] = None) -> List[str]:
+        """The tables the question itself points at, before select() adds bridges and FK neighbours."""
+        return self._match(self.score(question), top_k, min_relative_score, required)[0]
+
+    def select(self, question: str, top_k: int = 5, token_budget: Optional[int] = None,
+               min_relative_score: float = 0.5, required: Optional[List[str]] = None) -> List[str]:
+        """
+        Picks up to top_k tables scoring within min_relative_score of the best
+        match, plus the FK neighbours of those matched by table name, stopping
+        once the token budget is spent. Falls back to every table when nothing
+        matches. Tables in required (e.g. from value linking) always rank first.
+        Bridge tables on the FK join paths between the matched tables
+        rank right after them. Returned names keep the catalog order so prompts
+        stay stable.
+        """
+        scores = self.score(question)
+        top, best = self._match(scores, top_k, min_relative_score, required)
+        terms = set(tokenize(question))
+        candidates = self._connect(top) if best > 0 else list(top)
+        for name in top:
+            if not terms.intersection(tokenize(name)):
+                continue
+            for neighbour in sorted(self._neighbours_of(name), key=lambda n: (-scores.get(n, 0), n)):
+                if neighbour not in candidates:
+                    candidates.append(neighbour)
+
+        selected, used = [], 0
+        for name in candidates:
+            cost = self._cost(name)
+            if token_budget is not None and selected and used + cost > token_budget:
+                continue
+            selected.append(name)
+            used += cost
+        order = {name: i for i, name in enumerate(self.table_names)}
+        return sorted(selected, key=order.__getitem__)
+
+    def render(self, table_names: List[str]) -> str:
+        return "\n\n".join(self.tables[name].description for name in table_names)
+
+    def table_info(self, name: str) -> TableInfo:
+        return self.tables[name]
+
+
+class LazySchemaIndex(SchemaIndex):
+    """
+    SchemaIndex for very large databases: only table names are indexed up
+    front; DDL, columns and FKs are loaded per table from a lazy mapping
+    (see schema_cache.LazyTableDescriptions) when a question selects them.
+    """
+
+    def __init__(self, tables: Mapping[str, str]):
+        self.descriptions = tables
+        self.table_names = sorted(tables)
+        self._build_terms(TableInfo(name=name, description="") for name in self.table_names)
+
+    @property
+    def full_tokens(self) -> Optional[int]:
+        return None
+
+    def _info(self, name: str) -> TableInfo:
+        return parse_table_description(name, self.descriptions[name])
+
+    def _cost(self, name: str) -> int:
+        return estimate_tokens(self.descriptions[name])
+
+    def _neighbours_of(self, name: str) -> List[str]:
+        known = set(self.table_names)
+        return [ref for _, ref, _ in self._info(name).foreign_keys if ref in known and ref != name]
+
+    def _fallback(self, top_k: int) -> List[str]:
+        return self.table_names[:top_k]
+
+    def _connect(self, tables: List[str]) -> List[str]:
+        # Only FKs of loaded tables are known, so join through direct neighbours.
+        infos = {name: self._info(name) for name in tables}
+        for name in tables:
+            for ref in self._neighbours_of(name):
+                infos.setdefault(ref, self._info(ref))
+        return JoinGraph(infos).connect(tables)[0]
+
+    def join_edges(self, table_names: List[str]) -> List[JoinEdge]:
+        graph = JoinGraph({name: self._info(name) for name in table_names})
+        return graph.connect(table_names)[1]
+
+    def render(self, table_names: List[str]) -> str:
+        return "\n\n".join(self.descriptions[name] for name in table_names)
+
+    def table_info(self, name: str) -> TableInfo:
+        return self._info(name)
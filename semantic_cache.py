@@ -0,0 +1,211 @@
+# app/semantic_cache.py
+
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional, Set, Tuple
+
+from query_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_CAPITALIZED_RE = re.compile(r"(?<![\w'])[A-Z][\w/&'.-]*")
+_QUOTED_RE = re.compile(r"""(?:^|(?<=\s))["'“‘]([^"'”’]+)["'”’]""")
+_SENTENCE_START_RE = re.compile(r"(?:^|[.?!]\s+)([A-Z][\w/&'.-]*)")
+_NEGATION_RE = re.compile(r"n['’]t\b", re.IGNORECASE)
+
+# Words that flip or bound the answer: two questions differing only in one of
+# these ("hired after" / "hired before") must not share SQL.
+POLARITY_WORDS = {
+    "not", "no", "never", "without", "except", "neither", "nor", "only",
+    "after", "before", "since", "until", "during", "between",
+    "more", "less", "fewer", "greater", "above", "below", "over", "under",
+    "first", "last", "earliest", "latest", "oldest", "newest", "ascending", "descending",
+}
+
+# Aggregate and superlative words, mapped to one token per meaning so
+# synonyms ("highest" / "most", "mean" / "average") still compare equal while
+# "average" vs "total" or "number" vs "sum" never share SQL.
+AGGREGATE_WORDS = {
+    "count": "count", "number": "count", "many": "count",
+    "sum": "sum", "total": "sum",
+    "average": "avg", "avg": "avg", "mean": "avg",
+    "distinct": "distinct", "unique": "distinct",
+    "most": "most", "top": "most", "highest": "most", "max": "most", "maximum": "most",
+    "largest": "most", "biggest": "most", "greatest": "most",
+    "least": "least", "bottom": "least", "lowest": "least", "min": "least", "minimum": "least",
+    "smallest": "least", "fewest": "least",
+}
+
+# Function words only; quantifiers like "most"/"least"/"top" change the answer.
+FILLER_WORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "is", "are", "was", "were", "be",
+    "what", "which", "who", "whose", "me", "show", "list", "give", "find", "tell", "please",
+    "there", "that", "this", "do", "does", "did", "has", "have", "had", "with", "can", "you",
+}
+
+
+def _stem(word: str) -> str:
+    if len(word) > 3 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def shingles(question: str) -> FrozenSet[str]:
+    """Word unigrams/bigrams plus character trigrams of the content words."""
+    words = [_stem(w) for w in normalize_question(question).split() if w not in FILLER_WORDS]
+    features: Set[str] = set(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f"#{word}#"
+        features.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(features)
+
+
+def literals(question: str, values: Iterable[str] = ()) -> Tuple[str, ...]:
+    """
+    The parts of a question that must match exactly for two questions to share
+    SQL: numbers, capitalized or quoted tokens (entities), linked column
+    values, negation/comparison words and aggregates (normalized, so
+    "highest" and "most" are the same literal). Paraphrases that change the
+    wording more than that ("most albums" / "highest album count") still fall
+    below the Jaccard threshold and miss.
+    """
+    found = set(_NUMBER_RE.findall(question))
+    sentence_starts = {m.start(1) for m in _SENTENCE_START_RE.finditer(question)}
+    found.update(m.group(0).rstrip(".").casefold() for m in _CAPITALIZED_RE.finditer(question)
+                 if m.start() not in sentence_starts)
+    found.update(m.group(1).strip().casefold() for m in _QUOTED_RE.finditer(question))
+    found.update(str(v).casefold() for v in values)
+    for word in normalize_question(question).split():
+        if word in POLARITY_WORDS:
+            found.add(word)
+        elif _stem(word) in AGGREGATE_WORDS:
+            found.add(AGGREGATE_WORDS[_stem(word)])
+    if _NEGATION_RE.search(question):
+        found.add("not")
+    return tuple(sorted(found))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class SemanticMatch(NamedTuple):
+    sql: str
+    question: str
+    similarity: float
+
+
+class _Entry(NamedTuple):
+    namespace: str
+    features: FrozenSet[str]
+    literals: Tuple[str, ...]
+    band_keys: Tuple[int, ...]
+    sql: str
+    question: str
+
+
+class SemanticQuestionCache:
+    """
+    Near-duplicate question cache using MinHash signatures and LSH banding,
+    so a lookup only compares against questions sharing at least one band
+    bucket instead of scanning every entry. Candidates are verified with exact
+    Jaccard similarity and must mention the same literals: numbers ("top 5" !=
+    "top 10"), entities ("Brazil" != "Canada"), comparison words ("after"
+    != "before") and aggregates ("average" != "total"). Pass the question's linked column values as `values`.
+    """
+
+    def __init__(self, threshold: float = 0.7, num_perm: int = 64, bands: int = 16, max_entries: int = 100_000,
+                 seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        seeds = hashlib.sha256(str(seed).encode()).digest()
+        rng = int.from_bytes(seeds, "big")
+        self._perms = []
+        for _ in range(num_perm):
+            rng = (rng * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            a = rng % (_MERSENNE_PRIME - 1) + 1
+            rng = (rng * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            self._perms.append((a, rng % _MERSENNE_PRIME))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[int, Set[int]] = defaultdict(set)
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _band_keys(self, namespace: str, features: FrozenSet[str]) -> Tuple[int, ...]:
+        hashes = [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "big")
+                  for f in features] or [0]
+        signature = [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms]
+        keys = []
+        for band in range(self.bands):
+            chunk = tuple(signature[band * self.rows:(band + 1) * self.rows])
+            keys.append(hash((namespace, band, chunk)))
+        return tuple(keys)
+
+    def lookup(self, question: str, namespace: str, values: Iterable[str] = ()) -> Optional[SemanticMatch]:
+        """Returns the most similar cached question above the threshold, if any."""
+        features = shingles(question)
+        key_literals = literals(question, values)
+        band_keys = self._band_keys(namespace, features)
+        with self._lock:
+            candidates: Set[int] = set()
+            for key in band_keys:
+                candidates.update(self._buckets.get(key, ()))
+            best_id, best = None, None
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if entry.namespace != namespace or entry.literals != key_literals:
+                    continue
+                similarity = jaccard(features, entry.features)
+                if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                    best_id, best = entry_id, SemanticMatch(entry.sql, entry.question, similarity)
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return best
+
+    def add(self, question: str, namespace: str, sql: str, values: Iterable[str] = ()) -> None:
+        features = shingles(question)
+        entry = _Entry(namespace, features, literals(question, values),
+                       self._band_keys(namespace, features), sql, question)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            for key in entry.band_keys:
+                self._buckets[key].add(entry_id)
+            while len(self._entries) > self.max_entries:
+                old_id, old = self._entries.popitem(last=False)
+                for key in old.band_keys:
+                    bucket = self._buckets[key]
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "buckets": len(self._buckets),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,211 @@
+# app/speculative.py
+
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Union
+
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from query_budget import PROGRESS_OPS, CancelHandle, QueryBudget, interrupt_connection
+from query_result import QueryResult
+from result_stream import ResultLimits, RowCollector
+from schema_cache import sqlite_file_path
+
+logger = logging.getLogger(__name__)
+
+# Appended to the generation prompt so candidates explore different phrasings.
+PROMPT_VARIANTS = [
+    "",
+    "\nPrefer explicit JOIN ... ON clauses over subqueries.",
+    "\nPrefer subqueries or CTEs where they make the intent clearer.",
+    "\nDouble-check column names against the schema before answering.",
+]
+DEFAULT_TEMPERATURES = [0.0, 0.3, 0.6, 0.9]
+
+
+def clean_sql(response) -> str:
+    text = response if isinstance(response, str) else response.content
+    text = text.strip().strip("`").strip()
+    if text.lower().startswith("sql\n"):
+        text = text[4:]
+    return text.strip()
+
+
+def is_read_query(sql: str) -> bool:
+    return sql.lstrip("( \n\t").upper().startswith(("SELECT", "WITH"))
+
+
+def _with_variant(prompt: Union[str, List[BaseMessage]], variant: str):
+    """Appends a prompt variant at the very end, keeping the shared prefix intact."""
+    if isinstance(prompt, str):
+        return prompt + variant
+    return prompt[:-1] + [HumanMessage(content=prompt[-1].content + variant)]
+
+
+def _with_temperature(llm, temperature: float):
+    if hasattr(llm, "inner"):  # rate-limited wrapper around the real client
+        return llm.model_copy(update={"inner": _with_temperature(llm.inner, temperature)})
+    if not hasattr(llm, "temperature") or not hasattr(llm, "model_copy"):
+        return llm
+    return llm.model_copy(update={"temperature": temperature})
+
+
+class _ReadOnlyConnection:
+    """One DBAPI connection opened read-only, with a best-effort cancel()."""
+
+    def __init__(self, db: SQLDatabase):
+        self._raw = None
+        self.dialect = db.dialect
+        db_file = sqlite_file_path(db)
+        if db_file:
+            self.dbapi = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._raw = db._engine.raw_connection()
+            self.dbapi = self._raw.driver_connection
+            if db.dialect in ("postgresql", "mysql"):
+                cursor = self._raw.cursor()
+                cursor.execute("SET TRANSACTION READ ONLY")
+                cursor.close()
+
+    def execute(self, sql: str, max_string_length: int, limits: ResultLimits,
+                cancel: Optional[CancelHandle] = None) -> QueryResult:
+        budget = QueryBudget(limits.timeout, cancel)
+        if self._raw is None:
+            self.dbapi.set_progress_handler(budget.progress, PROGRESS_OPS)
+        cursor = (self._raw or self.dbapi).cursor()
+        try:
+            if self.dialect == "postgresql" and limits.timeout:
+                cursor.execute(f"SET LOCAL statement_timeout = {budget.statement_timeout_ms()}")
+            cursor.execute(sql)
+            columns = [d[0] for d in cursor.description] if cursor.description else []
+            collector = RowCollector(limits, columns, max_string_length)
+            while True:
+                batch = cursor.fetchmany(limits.fetch_size) if cursor.description else []
+                if not batch or not collector.add(batch):
+                    break
+                budget.check()
+        except Exception as e:
+            error = budget.translate(e)
+            if error is e:
+                raise
+            raise error from e
+        finally:
+            cursor.close()
+        return collector.finish()
+
+    def cancel(self) -> None:
+        interrupt_connection(self.dbapi)
+
+    def close(self) -> None:
+        try:
+            if self._raw is not None:
+                self._raw.rollback()
+                self._raw.close()
+            else:
+                self.dbapi.close()
+        except Exception:
+            pass
+
+
+def speculative_generate_and_execute(prompt: Union[str, List[BaseMessage]], llm, db: SQLDatabase, candidates: int = 3,
+                                     temperatures: Optional[Sequence[float]] = None,
+                                     timeout: Optional[float] = None,
+                                     limits: ResultLimits = ResultLimits(),
+                                     cancel: Optional[CancelHandle] = None) -> Dict:
+    """
+    Generates `candidates` SQL queries in parallel (different temperatures and
+    prompt variants), executes each on its own read-only connection as soon
+    as it is generated, and returns the first successful non-empty result,
+    interrupting the candidates still running. Falls back to the first
+    successful empty result, then to the first error. Every candidate
+    connection is registered with cancel, so cancelling it stops them all.
+    """
+    temperatures = list(temperatures or DEFAULT_TEMPERATURES)
+    cancelled = threading.Event()
+    active: List[_ReadOnlyConnection] = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def run_candidate(i: int) -> Dict:
+        candidate_llm = _with_temperature(llm, temperatures[i % len(temperatures)])
+        try:
+            sql = clean_sql(candidate_llm.invoke(_with_variant(prompt, PROMPT_VARIANTS[i % len(PROMPT_VARIANTS)])))
+        except Exception as e:
+            # One failed generation (e.g. a 429) must not sink the other candidates.
+            logger.warning(f"Speculative candidate {i} failed to generate: {e}")
+            return {"index": i, "sql": "", "error": f"Error: {e}"}
+        if cancelled.is_set() or (cancel is not None and cancel.cancelled):
+            return {"index": i, "sql": sql, "error": "cancelled"}
+        if not is_read_query(sql):
+            return {"index": i, "sql": sql, "error": "Error: only SELECT/WITH queries are allowed"}
+        conn = _ReadOnlyConnection(db)
+        with lock:
+            active.append(conn)
+        if cancel is not None:
+            cancel.attach(conn.dbapi)
+        try:
+            result = conn.execute(sql, db._max_string_length, limits, cancel)
+            return {"index": i, "sql": sql, "result": result}
+        except Exception as e:
+            return {"index": i, "sql": sql, "error": f"Error: {e}"}
+        finally:
+            if cancel is not None:
+                cancel.detach(conn.dbapi)
+            with lock:
+                active.remove(conn)
+            conn.close()
+
+    pool = ThreadPoolExecutor(max_workers=candidates, thread_name_prefix="speculative")
+    pending = {pool.submit(run_candidate, i) for i in range(candidates)}
+    outcomes: List[Dict] = []
+    winner = None
+    deadline = None if timeout is None else start + timeout
+    try:
+        while pending and winner is None:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                outcome = future.result()
+                outcome["ms"] = (time.perf_counter() - start) * 1000
+                outcomes.append(outcome)
+                if winner is None and outcome.get("result") is not None and len(outcome["result"]):
+                    winner = outcome
+    finally:
+        cancelled.set()
+        for future in pending:
+            future.cancel()
+        with lock:
+            for conn in active:
+                conn.cancel()
+        pool.shutdown(wait=False)
+
+    if winner is None:
+        winner = next((o for o in outcomes if "result" in o), None)
+    if winner is None:
+        winner = outcomes[0] if outcomes else {"index": -1, "sql": "", "error": "Error: no candidate finished"}
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logger.info(
+        f"Speculative generation: candidate {winner['index']} won after {elapsed_ms:.0f} ms "
+        f"({len(outcomes)}/{candidates} finished): {winner['sql']}"
+    )
+    result = winner.get("result")
+    return {
+        "sql": winner["sql"],
+        "result": result if result is not None else winner.get("error", ""),
+        "truncated": result is not None and result.truncated,
+        "note": result.note() if result is not None else "",
+        "succeeded": result is not None,
+        "cancelled": cancel is not None and cancel.cancelled,
+        "metrics": {
+            "speculative_candidates": candidates,
+            "speculative_finished": len(outcomes),
+            "speculative_winner": winner["index"],
+            "speculative_ms": elapsed_ms,
+        },
+    }
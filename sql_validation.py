@@ -0,0 +1,119 @@
+# app/sql_validation.py
+
+import logging
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from schema_retrieval import SchemaIndex, TableInfo
+
+try:
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import ParseError
+except ImportError:  # optional: without it only EXPLAIN is used
+    sqlglot = None
+
+logger = logging.getLogger(__name__)
+
+SQLGLOT_DIALECTS = {"sqlite": "sqlite", "postgresql": "postgres", "mysql": "mysql", "mssql": "tsql",
+                    "oracle": "oracle", "duckdb": "duckdb", "snowflake": "snowflake", "bigquery": "bigquery"}
+EXPLAIN_PREFIXES = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN ", "mysql": "EXPLAIN ",
+                    "duckdb": "EXPLAIN "}
+MAX_LISTED_NAMES = 30
+_FULL_SCAN_RE = re.compile(r"^SCAN (\S+)")
+
+
+def _names(values: List[str]) -> str:
+    listed = ", ".join(values[:MAX_LISTED_NAMES])
+    return listed + (", ..." if len(values) > MAX_LISTED_NAMES else "")
+
+
+def check_catalog(sql: str, dialect: str, index: SchemaIndex) -> Optional[str]:
+    """
+    Parses the query with sqlglot and checks referenced tables and columns
+    against the schema catalog. Returns an error message, or None when the
+    query looks valid (or sqlglot isn't installed).
+    """
+    if sqlglot is None:
+        return None
+    try:
+        tree = sqlglot.parse_one(sql, read=SQLGLOT_DIALECTS.get(dialect))
+    except ParseError as e:
+        return f"Syntax error: {e}"
+    if tree is None:
+        return "Syntax error: empty query"
+
+    by_lower = {name.lower(): name for name in index.table_names}
+    ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    tables: Dict[str, TableInfo] = {}
+    for table in tree.find_all(exp.Table):
+        if table.name.lower() in ctes:
+            continue
+        name = by_lower.get(table.name.lower())
+        if name is None:
+            return f"Unknown table '{table.name}'. Available tables: {_names(index.table_names)}"
+        tables[table.alias_or_name.lower()] = index.table_info(name)
+
+    # Columns of CTEs and derived tables aren't in the catalog, so unqualified
+    # names are only checked when every source is a catalog table.
+    derived = bool(ctes) or any(isinstance(s.parent, (exp.From, exp.Join)) for s in tree.find_all(exp.Subquery))
+    aliases = {alias.alias.lower() for alias in tree.find_all(exp.Alias)}
+    columns = {key: {c.lower() for c in info.columns} for key, info in tables.items()}
+    for column in tree.find_all(exp.Column):
+        if isinstance(column.this, exp.Star):
+            continue
+        name, qualifier = column.name.lower(), column.table.lower()
+        if qualifier:
+            info = tables.get(qualifier)
+            if info is not None and info.columns and name not in columns[qualifier]:
+                return f"Unknown column '{column.table}.{column.name}'. {info.name} has columns: {_names(info.columns)}"
+        elif not derived and name not in aliases and tables and all(info.columns for info in tables.values()):
+            # SQLite reads unknown double-quoted identifiers as string literals.
+            if dialect == "sqlite" and column.this.quoted:
+                continue
+            if not any(name in cols for cols in columns.values()):
+                searched = ", ".join(info.name for info in tables.values())
+                return f"Unknown column '{column.name}' (not in {searched})"
+    return None
+
+
+def _nested_full_scans(plan: List[tuple]) -> Optional[List[str]]:
+    """Sibling full SCANs in a SQLite query plan are nested loops over whole tables."""
+    scans = defaultdict(list)
+    for _, parent, _, detail in plan:
+        match = _FULL_SCAN_RE.match(detail)
+        if match:
+            scans[parent].append(match.group(1))
+    return next((names for names in scans.values() if len(names) > 1), None)
+
+
+def explain(db: SQLDatabase, sql: str) -> Optional[str]:
+    """
+    Asks the database to plan (not run) the query. Returns the planner's
+    error, a warning for nested full table scans (SQLite), or None.
+    """
+    prefix = EXPLAIN_PREFIXES.get(db.dialect)
+    if prefix is None:
+        return None
+    try:
+        with db._engine.connect() as connection:
+            plan = connection.exec_driver_sql(prefix + sql.strip().rstrip(";")).fetchall()
+    except Exception as e:
+        message = str(getattr(e, "orig", None) or e).split("\n")[0]
+        return f"Database rejected the query: {message}"
+    if db.dialect == "sqlite" and "CROSS JOIN" not in sql.upper():
+        scanned = _nested_full_scans(plan)
+        if scanned:
+            return (f"The query plan nests full scans of {' and '.join(scanned)}, i.e. a cartesian product or a "
+                    f"join without an indexable condition. Join these tables on their foreign key columns.")
+    return None
+
+
+def validate_sql(sql: str, db: SQLDatabase, index: SchemaIndex) -> Optional[str]:
+    """Returns the first problem found by the local parser/catalog check or EXPLAIN, else None."""
+    if not sql.strip():
+        return "Empty query"
+    return check_catalog(sql, db.dialect, index) or explain(db, sql)
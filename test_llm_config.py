@@ -0,0 +1,33 @@
+# app/test_llm_config.py
+
+from hedging import HedgedChatModel
+from llm_config import get_llm, llm_identity, llm_registry
+from rate_limit import LLMScheduler, RateLimitedChatModel
+
+HEDGE = {"provider": "fake", "model_name": "fake-secondary", "initial_delay": 0.05}
+
+
+def test_identity_distinguishes_fake_models_and_temperatures():
+    identities = {
+        llm_identity(get_llm("fake", model_name="fake-a")),
+        llm_identity(get_llm("fake", model_name="fake-b")),
+        llm_identity(get_llm("fake", model_name="fake-a", temperature=0.5)),
+    }
+    assert len(identities) == 3
+
+
+def test_hedged_identity_looks_through_wrappers():
+    llm_registry.set_rate_limit("fake", 6000)
+    a = get_llm("fake", session_id="s1", model_name="fake-a", hedge=HEDGE)
+    b = get_llm("fake", session_id="s1", model_name="fake-b", hedge=HEDGE)
+    assert llm_identity(a) != llm_identity(b)
+    assert "fake-a" in llm_identity(a) and "fake-secondary" in llm_identity(a)
+    assert "None" not in llm_identity(a)
+
+
+def test_hedged_model_name_looks_through_rate_limiting():
+    scheduler = LLMScheduler(requests_per_minute=6000)
+    primary = RateLimitedChatModel(inner=get_llm("ollama", model_name="llama3.1"), scheduler=scheduler)
+    hedged = HedgedChatModel(primary=primary, secondary=get_llm("ollama", model_name="qwen2.5"))
+    assert hedged.model == "hedged(llama3.1, qwen2.5)"
+
@@ -0,0 +1,33 @@
+# app/test_model_router.py
+
+import pytest
+
+from agent import load_schema_catalog, route_model_node
+from model_router import ModelRouter
+from utils import get_db_connection
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    db = get_db_connection("sqlite:///Chinook.db")
+    return load_schema_catalog(db, schema_cache_dir=None).snapshot()
+
+
+@pytest.mark.parametrize("question", [
+    "how many tracks are there",
+    "how many customers are there",
+    "how many invoices are there",
+    "how many artists are there",
+])
+def test_trivial_single_table_counts_go_to_the_small_model(snapshot, question):
+    update = route_model_node({"user_question": question}, ModelRouter("small", "large"), snapshot)
+    assert update["model_route"] == "small", update["metrics"]
+
+
+@pytest.mark.parametrize("question", [
+    "total sales per genre per year compared to the average of each country",
+    "which customers never bought a track from an artist with more than 10 albums",
+])
+def test_complex_questions_go_to_the_large_model(snapshot, question):
+    update = route_model_node({"user_question": question}, ModelRouter("small", "large"), snapshot)
+    assert update["model_route"] == "large", update["metrics"]
@@ -0,0 +1,34 @@
+# app/test_semantic_cache.py
+
+import pytest
+
+from semantic_cache import SemanticQuestionCache, literals
+
+NEAR_MISSES = [
+    ("total invoice total per customer", "average invoice total per customer"),
+    ("sum of invoices per customer country", "number of invoices per customer country"),
+    ("total unit price per genre", "average unit price per genre"),
+    ("count of distinct customers per country", "count of customers per country"),
+    ("customer with the most invoices", "customer with the least invoices"),
+    ("longest track per genre by maximum milliseconds", "longest track per genre by minimum milliseconds"),
+]
+
+
+@pytest.mark.parametrize("cached, asked", NEAR_MISSES)
+def test_different_aggregates_do_not_share_sql(cached, asked):
+    cache = SemanticQuestionCache()
+    cache.add(cached, "ns", "SELECT 1")
+    assert cache.lookup(asked, "ns") is None
+
+
+def test_paraphrase_with_same_literals_hits():
+    cache = SemanticQuestionCache()
+    cache.add("top 5 customers by total spend", "ns", "SELECT 1")
+    match = cache.lookup("show the top 5 customers by total spend", "ns")
+    assert match is not None and match.sql == "SELECT 1"
+
+
+def test_synonymous_superlatives_normalize_to_one_literal():
+    assert literals("artist with the most albums") == literals("artist with the highest albums")
+    assert literals("mean invoice total") == literals("average invoice total")
+    assert literals("fewest tracks") == literals("lowest tracks")
@@ -1,17 +1,92 @@
 # app/utils.py
 
 import os
+import logging
+import sqlite3
+import weakref
 import requests
 import pandas as pd
+from sqlalchemy import create_engine, event
 from langchain_community.utilities.sql_database import SQLDatabase
 
+logger = logging.getLogger(__name__)
+
 CHINOOK_URL = "https://storage.googleapis.com/benchmarks-artifacts/chinook/Chinook.db"
 
-def get_db_connection(db_uri: str) -> SQLDatabase | None:
+# Applied to every pooled read-only SQLite connection; override per call with sqlite_pragmas.
+SQLITE_PRAGMAS = {
+    "query_only": "ON",
+    "mmap_size": 256 * 1024 * 1024,  # read pages straight from the OS page cache
+    "cache_size": -64 * 1024,        # negative: KiB, i.e. 64 MB per connection
+}
+SQLITE_POOL_SIZE = 8
+
+# Engines built by create_sqlite_engine -> (db_file, pragmas), so their async twins are opened the same way.
+_read_only_sqlite = weakref.WeakKeyDictionary()
+
+
+def sqlite_journal_mode(db_file: str) -> str:
+    """Reads the journal mode from the file header (bytes 18/19 are 2 in WAL mode) without opening it."""
+    with open(db_file, "rb") as f:
+        header = f.read(20)
+    return "wal" if len(header) == 20 and header[18] == 2 else "rollback"
+
+
+def create_sqlite_engine(db_file: str, pragmas: dict | None = None, pool_size: int = SQLITE_POOL_SIZE):
+    """
+    Engine over a SQLite file opened read-only (mode=ro URI) with pragmas
+    applied on connect. Connections can be used from any thread and are
+    pooled LIFO, so the most recently used (warmest) connection is reused.
+    A WAL database needs its -wal/-shm files present or its directory
+    writable to be opened read-only.
+    """
+    db_file = os.path.abspath(db_file)
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    engine = create_engine(
+        f"sqlite:///{db_file}",
+        creator=lambda: sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=False),
+        pool_size=pool_size,
+        max_overflow=2 * pool_size,
+        pool_use_lifo=True,
+    )
+
+    _apply_pragmas_on_connect(engine, pragmas)
+    _read_only_sqlite[engine] = (db_file, pragmas)
+    logger.info(f"SQLite read-only pool for {db_file} ({sqlite_journal_mode(db_file)} journal): {pragmas}")
+    return engine
+
+
+def create_async_sqlite_engine(db_file: str, pragmas: dict | None = None):
+    """aiosqlite counterpart of create_sqlite_engine: same read-only URI and pragmas."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    # A URL rather than async_creator, so the dialect still marks aiosqlite's worker threads as daemons.
+    engine = create_async_engine(f"sqlite+aiosqlite:///file:{db_file}?mode=ro&uri=true")
+    _apply_pragmas_on_connect(engine.sync_engine, pragmas)
+    return engine
+
+
+def _apply_pragmas_on_connect(engine, pragmas: dict) -> None:
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def get_db_connection(db_uri: str, lazy_table_reflection: bool = True, sqlite_read_only: bool = True,
+                      sqlite_pragmas: dict | None = None) -> SQLDatabase | None:
     """
     Establish a connection to a SQL database from a given URI.
     If the URI points to a local SQLite Chinook.db and it doesn't exist,
     it will attempt to download it automatically.
+    With lazy_table_reflection (the default), tables are only reflected when
+    first described, which schema_cache.describe_tables does in parallel and
+    skips entirely on a warm schema cache, instead of serially at connect time.
+    With sqlite_read_only (the default), a SQLite file is opened through
+    create_sqlite_engine: read-only, tuned pragmas, pooled connections.
     """
     if db_uri.startswith("sqlite:///"):
         db_file = db_uri.split("sqlite:///")[1]
@@ -27,12 +102,58 @@ def get_db_connection(db_uri: str) -> SQLDatabase | None:
                 print(f"Failed to download the file: {e}")
                 return None
     try:
-        return SQLDatabase.from_uri(db_uri)
+        if sqlite_read_only and db_uri.startswith("sqlite:///") and db_uri != "sqlite:///:memory:":
+            engine = create_sqlite_engine(db_uri.split("sqlite:///")[1], sqlite_pragmas)
+            return SQLDatabase(engine, lazy_table_reflection=lazy_table_reflection)
+        return SQLDatabase.from_uri(db_uri, lazy_table_reflection=lazy_table_reflection)
     except Exception as e:
         print(f"Failed to connect to the database: {e}")
         return None
 
 
+# Async drivers used for the async graph path, keyed by SQLAlchemy backend name.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+class AsyncSQLDatabase:
+    """
+    AsyncEngine plus the SQLDatabase settings that astream_query needs, used
+    by the async graph nodes so queries don't occupy a thread while waiting.
+    """
+
+    def __init__(self, engine, schema: str | None = None, max_string_length: int = 300):
+        self.engine = engine
+        self.schema = schema
+        self.max_string_length = max_string_length
+
+    @classmethod
+    def from_sync(cls, db: SQLDatabase) -> "AsyncSQLDatabase | None":
+        """Builds an async twin of db, or returns None if no async driver is installed."""
+        url = db._engine.url
+        driver = ASYNC_DRIVERS.get(url.get_backend_name())
+        if driver is None:
+            return None
+        try:
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            read_only = _read_only_sqlite.get(db._engine)
+            if read_only is not None:
+                engine = create_async_sqlite_engine(*read_only)
+            else:
+                engine = create_async_engine(url.set(drivername=driver))
+        except ImportError as e:
+            logger.warning(f"Async driver {driver} unavailable, falling back to threads: {e}")
+            return None
+        return cls(engine, db._schema, db._max_string_length)
+
+    async def dispose(self) -> None:
+        await self.engine.dispose()
+
+
 def get_schema(db: SQLDatabase) -> str:
     """
     Returns the database schema (tables + columns) as a string.
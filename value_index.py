@@ -0,0 +1,247 @@
+# app/value_index.py
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import String, inspect, select, func, table, column
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from schema_retrieval import STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+_build_locks: Dict[str, threading.Lock] = {}
+_build_locks_lock = threading.Lock()
+
+MAGIC = b"SQLVIDX1"
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_value(value: str) -> str:
+    """Case/punctuation folding used for both indexed values and question spans."""
+    return _NON_ALNUM_RE.sub(" ", value.lower()).strip()
+
+
+def _trigrams(key: str) -> List[str]:
+    padded = f" {key} "
+    return sorted({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+class ValueMatch(NamedTuple):
+    table: str
+    column: str
+    value: str
+    span: str
+    score: float
+
+
+def build_value_index(db: SQLDatabase, path: str, max_distinct: int = 1000, max_length: int = 100) -> Dict:
+    """
+    Writes a memory-mappable trigram index over the distinct values of every
+    text column with at most max_distinct distinct values. Returns build stats.
+    """
+    start = time.perf_counter()
+    inspector = inspect(db._engine)
+    columns: List[List[str]] = []
+    entries = []  # (normalized key, original value, column id)
+    with db._engine.connect() as conn:
+        for table_name in db.get_usable_table_names():
+            for col in inspector.get_columns(table_name, schema=db._schema):
+                if not isinstance(col["type"], String):
+                    continue
+                tbl = table(table_name, column(col["name"]), schema=db._schema)
+                distinct = conn.execute(select(func.count(func.distinct(tbl.c[col["name"]])))).scalar()
+                if not distinct or distinct > max_distinct:
+                    continue
+                column_id = len(columns)
+                columns.append([table_name, col["name"]])
+                for (value,) in conn.execute(select(tbl.c[col["name"]]).distinct()):
+                    if not isinstance(value, str) or len(value) > max_length:
+                        continue
+                    key = normalize_value(value)
+                    if len(key) >= 2:
+                        entries.append((key, value, column_id))
+
+    postings: Dict[str, List[int]] = defaultdict(list)
+    blob = bytearray()
+    entry_table = array("I")
+    for entry_id, (key, value, column_id) in enumerate(entries):
+        for gram in _trigrams(key):
+            postings[gram].append(entry_id)
+        data = f"{key}\t{value}".encode("utf-8")
+        entry_table.extend((len(blob), len(data), column_id))
+        blob += data
+
+    posting_array = array("I")
+    grams = {}
+    for gram in sorted(postings):
+        grams[gram] = [len(posting_array), len(postings[gram])]
+        posting_array.extend(postings[gram])
+
+    header = json.dumps({"columns": columns, "grams": grams, "entries": len(entries),
+                         "postings_len": len(posting_array)}).encode("utf-8")
+    # Pad the header so the uint32 arrays that follow are 4-byte aligned.
+    header += b" " * (-(len(MAGIC) + 4 + len(header)) % 4)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # A unique temp file in the same directory, so concurrent builders never write the same file.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            f.write(posting_array.tobytes())
+            f.write(entry_table.tobytes())
+            f.write(blob)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates the file owner-only
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    stats = {
+        "columns": len(columns),
+        "values": len(entries),
+        "bytes": os.path.getsize(path),
+        "build_ms": (time.perf_counter() - start) * 1000,
+    }
+    logger.info(
+        f"Value index built: {stats['values']} values from {stats['columns']} columns, "
+        f"{stats['bytes'] / 1024:.1f} KiB in {stats['build_ms']:.0f} ms -> {path}"
+    )
+    return stats
+
+
+def ensure_value_index(db: SQLDatabase, path: str, **kwargs) -> None:
+    """Builds the index at path unless it exists; concurrent callers for one path share a single build."""
+    with _build_locks_lock:
+        lock = _build_locks.setdefault(os.path.abspath(path), threading.Lock())
+    with lock:
+        if not os.path.exists(path):
+            build_value_index(db, path, **kwargs)
+
+
+class ValueIndex:
+    """Read-only, mmap-backed view of a file written by build_value_index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a value index")
+        (header_len,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        offset = len(MAGIC) + 4
+        header = json.loads(self._mm[offset:offset + header_len])
+        offset += header_len
+        self.columns = [tuple(c) for c in header["columns"]]
+        self._grams = header["grams"]
+        view = memoryview(self._mm)
+        postings_end = offset + 4 * header["postings_len"]
+        self._postings = view[offset:postings_end].cast("I")
+        entries_end = postings_end + 12 * header["entries"]
+        self._entries = view[postings_end:entries_end].cast("I")
+        self._blob_offset = entries_end
+        logger.info(f"Value index loaded: {header['entries']} values, {len(self._mm) / 1024:.1f} KiB from {path}")
+
+    def __len__(self) -> int:
+        return len(self._entries) // 3
+
+    def _entry(self, entry_id: int):
+        blob_start, blob_len, column_id = self._entries[3 * entry_id:3 * entry_id + 3]
+        start = self._blob_offset + blob_start
+        key, value = self._mm[start:start + blob_len].decode("utf-8").split("\t", 1)
+        return key, value, column_id
+
+    def _best_for_span(self, span: str, min_score: float) -> Optional[ValueMatch]:
+        grams = _trigrams(span)
+        overlap: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            ref = self._grams.get(gram)
+            if ref:
+                for entry_id in self._postings[ref[0]:ref[0] + ref[1]]:
+                    overlap[entry_id] += 1
+        # Dice >= min_score needs at least this many shared trigrams.
+        needed = min_score * len(grams) / 2
+        best = None
+        for entry_id, common in overlap.items():
+            if common < needed:
+                continue
+            key, value, column_id = self._entry(entry_id)
+            score = 2 * common / (len(grams) + len(_trigrams(key)))
+            if score >= min_score and (best is None or score > best.score):
+                table_name, column_name = self.columns[column_id]
+                best = ValueMatch(table_name, column_name, value, span, score)
+        return best
+
+    def lookup(self, question: str, min_score: float = 0.8, max_span_words: int = 4) -> List[ValueMatch]:
+        """
+        Finds indexed values fuzzily mentioned in the question, preferring the
+        best-scoring non-overlapping word spans.
+        """
+        words = normalize_value(question).split()
+        found = []
+        for size in range(max_span_words, 0, -1):
+            for i in range(len(words) - size + 1):
+                span_words = words[i:i + size]
+                if all(w in STOPWORDS for w in span_words):
+                    continue
+                span = " ".join(span_words)
+                if len(span) < 3:
+                    continue
+                match = self._best_for_span(span, min_score)
+                if match:
+                    found.append((match.score, size, i, match))
+        matches, taken = [], set()
+        for _, size, i, match in sorted(found, key=lambda f: (-f[0], -f[1], f[2])):
+            positions = set(range(i, i + size))
+            if positions & taken:
+                continue
+            taken |= positions
+            matches.append(match)
+        return matches
+
+    def close(self) -> None:
+        self._postings.release()
+        self._entries.release()
+        self._mm.close()
+
+
+def describe_value_matches(matches: List[ValueMatch]) -> str:
+    """Renders matched literals as canonical column = 'value' lines for the prompt."""
+    lines = []
+    for m in matches:
+        value = m.value.replace("'", "''")
+        lines.append(f"{m.table}.{m.column} = '{value}'  (question mentions \"{m.span}\")")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the column value index used for entity linking.")
+    parser.add_argument("db_uri", help="Database URI, e.g. sqlite:///Chinook.db")
+    parser.add_argument("path", help="Output index file")
+    parser.add_argument("--max-distinct", type=int, default=1000, help="Skip columns with more distinct values")
+    parser.add_argument("--lookup", help="Question to resolve against the built index")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    from utils import get_db_connection
+
+    build_value_index(get_db_connection(args.db_uri), args.path, max_distinct=args.max_distinct)
+    if args.lookup:
+        index = ValueIndex(args.path)
+        start = time.perf_counter()
+        matches = index.lookup(args.lookup)
+        print(f"Lookup in {(time.perf_counter() - start) * 1000:.2f} ms")
+        print(describe_value_matches(matches))